@@ -17,41 +17,35 @@ async def async_main():
         print(f"Site {site.name} ({site.id})")
         circuits = site.get_circuits()
         all_dfs = []
+        chargers = []
         for circuit in circuits:
-            chargers = circuit.get_chargers()
-            for charger in chargers:
+            for charger in circuit.get_chargers():
                 # Some chargers return an error
                 try:
                     state = await charger.get_state()
                 except Exception as e:
                     print(f"    Error getting state for charger {charger.name} ({charger.id}): {e}")
                     continue
-                # Fetch one month at a time, as the API limits the requested time period
-                charger_consumption = []
-                year = 2025
-                for month in range(1 , 13):
-                    from_date = datetime(year, month, 1, 0, 0, 0, tzinfo=timezone.utc)
-                    if month == 12:
-                        to_date = datetime(year + 1 , 1, 1, 0, 0, 0, tzinfo=timezone.utc)
-                    else:
-                        to_date = datetime(year, month + 1, 1, 0, 0, 0, tzinfo=timezone.utc)
-                    if to_date > datetime.now(timezone.utc):
-                        to_date = datetime.now(timezone.utc)
-                    if from_date >= to_date:
-                        continue
-                    print(f"    Getting Charger: {charger.name} ({charger.id}) between {from_date} and {to_date}")
-                    consumption = await charger.get_hourly_consumption_between_dates(from_date, to_date)
-                    charger_consumption.extend(consumption)
-                print(f"    Total hours collected: {len(charger_consumption)}")
-                if charger_consumption:
-                    df = pl.DataFrame(charger_consumption)
-                    df = df.with_columns([
-                        pl.col("from").str.to_datetime().dt.replace_time_zone(None).alias("datetime"),
-                        pl.lit(charger.id).alias("chargerId")
-                    ])
-                    df = df.drop(["from", "to"])
-                    all_dfs.append(df)
-                    
+                chargers.append(charger)
+
+        # The library splits the year into month requests, as the API limits the requested time period
+        from_date = datetime(2025, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
+        to_date = min(datetime(2026, 1, 1, 0, 0, 0, tzinfo=timezone.utc), datetime.now(timezone.utc))
+        print(f"    Getting {len(chargers)} chargers between {from_date} and {to_date}")
+        consumption = {}
+        async for charger, record in easee.iter_hourly_consumption(chargers, from_date, to_date):
+            consumption.setdefault(charger.id, []).append(record)
+
+        for charger_id, charger_consumption in consumption.items():
+            print(f"    Total hours collected for {charger_id}: {len(charger_consumption)}")
+            df = pl.DataFrame(charger_consumption)
+            df = df.with_columns([
+                pl.col("from").str.to_datetime().dt.replace_time_zone(None).alias("datetime"),
+                pl.lit(charger_id).alias("chargerId")
+            ])
+            df = df.drop(["from", "to"])
+            all_dfs.append(df)
+
         if all_dfs:
             site_consumption = pl.concat(all_dfs)
             site_consumption.write_csv(f"hourly_consumption_{site.id}.csv")
@@ -2,10 +2,18 @@
 Easee charger API library
 """
 
+from .cache import *  # noqa:
 from .charger import *  # noqa:
 from .const import *  # noqa:
 from .easee import *  # noqa:
 from .easee import __VERSION__ as __version__  # noqa:
+from .export import *  # noqa:
+from .history import *  # noqa:
+from .response import *  # noqa:
+from .retry import *  # noqa:
+from .series import *  # noqa:
 from .site import *  # noqa:
+from .stream import *  # noqa:
 from .throttler import *  # noqa:
+from .token_store import *  # noqa:
 from .utils import *  # noqa:
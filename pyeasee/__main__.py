@@ -7,7 +7,15 @@ import sys
 import threading
 from typing import List
 
-from . import Charger, Circuit, DatatypesStreamData, Easee, Equalizer, Site
+from . import (
+    Charger,
+    Circuit,
+    DatatypesStreamData,
+    Easee,
+    Equalizer,
+    FileTokenStore,
+    Site,
+)
 from .utils import lookup_charger_stream_id, lookup_equalizer_stream_id
 
 CACHED_TOKEN = "easee-token.json"
@@ -57,6 +65,9 @@ def parse_arguments():
     parser.add_argument("-r", "--signalr", help="Listen to signalr stream", action="store_true")
     parser.add_argument("-co", "--cost", help="Retrieve cost for last year", action="store_true")
     parser.add_argument("--countries", help="Get active countries information", action="store_true")
+    parser.add_argument(
+        "-t", "--token", help=f"Cache the access token in {CACHED_TOKEN} between runs", action="store_true"
+    )
     parser.add_argument("-ou", "--ocppurl", help="OCPP URL")
     parser.add_argument("-od", "--ocppdisable", help="OCPP Disable", action="store_true")
     parser.add_argument(
@@ -84,24 +95,11 @@ def parse_arguments():
     return args
 
 
-# TODO: Add option to send in a cached token
-# def token_read():
-#     try:
-#         with open(CACHED_TOKEN, "r") as token_file:
-#             return json.load(token_file)
-#     except FileNotFoundError:
-#         return None
-
-
-# def token_write(token):
-#     with open(CACHED_TOKEN, "w") as token_file:
-#         json.dump(token, token_file, indent=2)
-
-
 async def async_main():
     args = parse_arguments()
     _LOGGER.debug("args: %s", args)
-    easee = Easee(args.username, args.password)
+    token_store = FileTokenStore(CACHED_TOKEN) if args.token else None
+    easee = Easee(args.username, args.password, token_store=token_store)
 
     if args.chargers:
         chargers: List[Charger] = await easee.get_chargers()
@@ -141,8 +139,12 @@ async def async_main():
             await equalizers_info(equalizers)
             circuits = site.get_circuits()
             await circuits_info(circuits)
+            site_state = await site.get_state()
             for circuit in circuits:
                 chargers = circuit.get_chargers()
+                if site_state is not None:
+                    for charger in chargers:
+                        charger.update_from_site_state(site_state)
                 await chargers_info(chargers)
 
     if args.summary:
@@ -171,6 +173,7 @@ async def async_main():
                     f" "
                 )
             circuits = site.get_circuits()
+            site_state = await site.get_state()
             for circuit in circuits:
                 print(
                     f"    "
@@ -182,8 +185,11 @@ async def async_main():
                 )
                 chargers = circuit.get_chargers()
                 for charger in chargers:
-                    state = await charger.get_state()
-                    config = await charger.get_config()
+                    if site_state is None or not charger.update_from_site_state(site_state):
+                        await charger.get_state()
+                        await charger.get_config()
+                    state = charger.state
+                    config = charger.config
                     print(
                         f"      "
                         f" Charger: {charger.__getitem__('name')}"
@@ -207,10 +213,12 @@ async def async_main():
                 try:
                     header = True
                     while True:
+                        # One site state request updates all chargers
+                        await site.refresh_chargers(chargers)
                         for charger in chargers:
                             await charger_loop(charger, header)
                             header = False
-                            await asyncio.sleep(5)
+                        await asyncio.sleep(5)
                 except KeyboardInterrupt as e:  # noqa
                     # Close connection on user interuption
                     print("Interrupted by user")
@@ -235,10 +243,7 @@ async def async_main():
             equalizers_site = site.get_equalizers()
             for equalizer in equalizers_site:
                 equalizers.append(equalizer)
-        for charger in chargers:
-            await easee.sr_subscribe(charger, print_signalr)
-        for equalizer in equalizers:
-            await easee.sr_subscribe(equalizer, print_signalr)
+        await easee.sr_subscribe_many(chargers + equalizers, print_signalr)
 
         queue = asyncio.Queue(1)
         input_thread = threading.Thread(target=add_input, args=(queue,))
@@ -278,8 +283,8 @@ async def chargers_info(chargers: List[Charger]):
     print("\n\n****************\nCHARGERS\n****************")
     data = []
     for charger in chargers:
-        state = await charger.get_state()
-        config = await charger.get_config()
+        state = charger.state if charger.state is not None else await charger.get_state()
+        config = charger.config if charger.config is not None else await charger.get_config()
         schedule = await charger.get_basic_charge_plan()
         week_schedule = await charger.get_weekly_charge_plan()
         observation_test = await charger.get_observations(30, 31, 35, 36, 45)
@@ -352,7 +357,7 @@ async def costs_info(costs):
 async def charger_loop(charger: Charger, header=False):
     """Return the state attributes."""
     # await charger.async_update()
-    state = await charger.get_state()
+    state = charger.state if charger.state is not None else await charger.get_state()
     # config = await charger.get_config() # not used yet
 
     if header:
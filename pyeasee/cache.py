@@ -0,0 +1,160 @@
+"""
+Client side cache for API responses
+"""
+
+from collections import OrderedDict
+import logging
+import re
+import time
+from typing import Dict, List
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CachePolicy:
+    """
+    Cache policy for the GET urls matching pattern. Responses are fresh for ttl seconds and are
+    then served stale, while refreshed in the background, for another stale_ttl seconds.
+    Responses with an ETag or Last-Modified header are kept after that and revalidated with a
+    conditional request, use ttl=0 to always revalidate.
+    """
+
+    def __init__(self, pattern: str, ttl: float, stale_ttl: float = 0):
+        self.pattern = re.compile(pattern)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+    def matches(self, url: str) -> bool:
+        return self.pattern.search(url) is not None
+
+
+DEFAULT_CACHE_POLICIES = [
+    CachePolicy(r"^/api/chargers/[^/]+/config$", ttl=60, stale_ttl=600),
+    CachePolicy(r"^/api/sites/[^/]+\?detailed=true$", ttl=300, stale_ttl=3600),
+    CachePolicy(r"^/api/sites/[^/]+/state$", ttl=0),
+    CachePolicy(r"^/firmware/[^/]+/latest$", ttl=3600, stale_ttl=86400),
+    CachePolicy(r"^/api/resources/(countries/active|currencies)$", ttl=86400, stale_ttl=7 * 86400),
+]
+
+
+def resource_prefix(url: str) -> str:
+    """The resource a url belongs to, e.g. /api/chargers/EH123456 for /api/chargers/EH123456/settings"""
+    return "/".join(url.split("?")[0].split("/")[:4])
+
+
+class CacheEntry:
+    def __init__(self, response, policy: CachePolicy):
+        self.response = response
+        self.policy = policy
+        self.stored = time.monotonic()
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+
+    def touch(self):
+        """The server confirmed the response is still current"""
+        self.stored = time.monotonic()
+
+    def has_validators(self) -> bool:
+        return self.etag is not None or self.last_modified is not None
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def age(self) -> float:
+        return time.monotonic() - self.stored
+
+    def is_fresh(self) -> bool:
+        return self.age() < self.policy.ttl
+
+    def is_usable(self) -> bool:
+        return self.age() < self.policy.ttl + self.policy.stale_ttl
+
+
+class ResponseCache:
+    """LRU cache of buffered GET responses with a TTL per endpoint family"""
+
+    def __init__(self, policies: List[CachePolicy] = None, max_entries: int = 256):
+        self.policies = DEFAULT_CACHE_POLICIES if policies is None else policies
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def policy(self, url: str) -> CachePolicy | None:
+        for policy in self.policies:
+            if policy.matches(url):
+                return policy
+        return None
+
+    def get(self, url: str) -> CacheEntry | None:
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        if not entry.is_usable() and not entry.has_validators():
+            del self._entries[url]
+            return None
+        self._entries.move_to_end(url)
+        return entry
+
+    def put(self, url: str, response, policy: CachePolicy):
+        entry = CacheEntry(response, policy)
+        if policy.ttl + policy.stale_ttl <= 0 and not entry.has_validators():
+            return
+        self._entries[url] = entry
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, url: str):
+        """Drop all entries for the resource url belongs to, called after a change to it"""
+        prefix = resource_prefix(url)
+        for cached_url in [u for u in self._entries if resource_prefix(u) == prefix]:
+            _LOGGER.debug("Invalidating cached %s after change to %s", cached_url, url)
+            del self._entries[cached_url]
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Responses kept only for their validators are always revalidated
+_REVALIDATE = CachePolicy(r"", ttl=0)
+
+
+class ValidatorStore:
+    """
+    The last GET responses that came with an ETag or Last-Modified header, so a later request for
+    the same url can be conditional and a 304 answered with the stored response. Independent of
+    ResponseCache, nothing is served from here without asking the server.
+    """
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, url: str) -> CacheEntry | None:
+        entry = self._entries.get(url)
+        if entry is not None:
+            self._entries.move_to_end(url)
+        return entry
+
+    def put(self, url: str, response):
+        entry = CacheEntry(response, _REVALIDATE)
+        if not entry.has_validators():
+            self._entries.pop(url, None)
+            return
+        self._entries[url] = entry
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
@@ -1,10 +1,11 @@
-from datetime import datetime, timezone
+import copy
+from datetime import datetime, timedelta, timezone
 import logging
-from typing import Any, Dict, Union
+from typing import Any, AsyncIterator, Dict, Union
 
 from .exceptions import NotFoundException, ServerFailureException
-from .throttler import Throttler
-from .utils import BaseDict
+from .history import HOURLY_USAGE, SESSIONS, to_epoch
+from .utils import BaseDict, CompactModel, parse_timestamp, split_date_range
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -83,6 +84,8 @@ REASON_FOR_NO_CURRENT = {
 class ChargerState(BaseDict):
     """Charger state with integer enum values converted to human readable string values"""
 
+    _datetime_keys = frozenset(["latestPulse"])
+
     def __init__(self, state: Dict[str, Any], raw=False):
         if not raw:
             data = {
@@ -101,6 +104,8 @@ class ChargerState(BaseDict):
 class ChargerConfig(BaseDict):
     """Charger config with integer enum values converted to human readable string values"""
 
+    _datetime_keys = frozenset()
+
     def __init__(self, config: Dict[str, Any], raw=False):
         if not raw:
             data = {
@@ -113,6 +118,97 @@ class ChargerConfig(BaseDict):
         super().__init__(data)
 
 
+class CompactChargerState(CompactModel):
+    """Charger state with raw values in a compact representation, for keeping many snapshots in memory"""
+
+    _float_fields = (
+        "totalPower",
+        "sessionEnergy",
+        "energyPerHour",
+        "dynamicCircuitCurrentP1",
+        "dynamicCircuitCurrentP2",
+        "dynamicCircuitCurrentP3",
+        "voltage",
+        "inCurrentT2",
+        "inCurrentT3",
+        "inCurrentT4",
+        "inCurrentT5",
+        "outputCurrent",
+        "inVoltageT1T2",
+        "inVoltageT1T3",
+        "inVoltageT1T4",
+        "inVoltageT1T5",
+        "inVoltageT2T3",
+        "inVoltageT2T4",
+        "inVoltageT2T5",
+        "inVoltageT3T4",
+        "inVoltageT3T5",
+        "inVoltageT4T5",
+        "cableRating",
+        "dynamicChargerCurrent",
+        "circuitTotalAllocatedPhaseConductorCurrentL1",
+        "circuitTotalAllocatedPhaseConductorCurrentL2",
+        "circuitTotalAllocatedPhaseConductorCurrentL3",
+        "circuitTotalPhaseConductorCurrentL1",
+        "circuitTotalPhaseConductorCurrentL2",
+        "circuitTotalPhaseConductorCurrentL3",
+    )
+    _object_fields = (
+        "smartCharging",
+        "cableLocked",
+        "chargerOpMode",
+        "wiFiRSSI",
+        "cellRSSI",
+        "localRSSI",
+        "outputPhase",
+        "latestPulse",
+        "chargerFirmware",
+        "latestFirmware",
+        "chargerRAT",
+        "lockCablePermanently",
+        "isOnline",
+        "ledMode",
+        "reasonForNoCurrent",
+        "wiFiAPEnabled",
+    )
+    _datetime_keys = frozenset(["latestPulse"])
+    __slots__ = _object_fields
+
+
+class CompactChargerConfig(CompactModel):
+    """Charger config with raw values in a compact representation, for keeping many snapshots in memory"""
+
+    _float_fields = (
+        "circuitMaxCurrentP1",
+        "circuitMaxCurrentP2",
+        "circuitMaxCurrentP3",
+        "maxChargerCurrent",
+    )
+    _object_fields = (
+        "isEnabled",
+        "lockCablePermanently",
+        "authorizationRequired",
+        "remoteStartRequired",
+        "smartButtonEnabled",
+        "wiFiSSID",
+        "detectedPowerGridType",
+        "offlineChargingMode",
+        "enableIdleCurrent",
+        "limitToSinglePhaseCharging",
+        "phaseMode",
+        "localNodeType",
+        "localAuthorizationRequired",
+        "localRadioChannel",
+        "localShortAddress",
+        "localParentAddrOrNumOfNodes",
+        "localPreAuthorizeEnabled",
+        "localAuthorizeOfflineEnabled",
+        "allowOfflineTxForUnknownId",
+        "ledStripBrightness",
+    )
+    __slots__ = _object_fields
+
+
 class ChargerSchedule(BaseDict):
     """Charger charging schedule/plan"""
 
@@ -219,6 +315,8 @@ class ChargerWeeklySchedule(BaseDict):
 class ChargerSession(BaseDict):
     """Charger charging session"""
 
+    _datetime_keys = frozenset(["carConnected", "carDisconnected"])
+
     def __init__(self, session: Dict[str, Any]):
         data = {
             "carConnected": session.get("carConnected"),
@@ -228,6 +326,12 @@ class ChargerSession(BaseDict):
         super().__init__(data)
 
 
+def _open_session_start(sessions) -> float:
+    """Start of the earliest session that has not ended, sessions after it can still change"""
+    starts = [parse_timestamp(s["carConnected"]).timestamp() for s in sessions if not s.get("carDisconnected")]
+    return min(starts, default=float("inf"))
+
+
 class Charger(BaseDict):
     def __init__(self, entries: Dict[str, Any], easee: Any, site: Any = None, circuit: Any = None):
         super().__init__(entries)
@@ -239,10 +343,9 @@ class Charger(BaseDict):
         self.site = site
         self.circuit = circuit
         self.easee = easee
-        self._consumption_between_dates_throttler = Throttler(
-            rate_limit=10, period=3600, name="consumption between dates"
-        )
-        self._sessions_between_dates_throttler = Throttler(rate_limit=10, period=3600, name="sessions between dates")
+        # Last known state and config, from get_state/get_config or a site state refresh
+        self.state: ChargerState = None
+        self.config: ChargerConfig = None
 
     async def get_observations(self, *args):
         """Gets observation IDs"""
@@ -255,20 +358,35 @@ class Charger(BaseDict):
     async def get_consumption_between_dates(self, from_date: datetime, to_date):
         """Gets consumption between two dates"""
         try:
-            async with self._consumption_between_dates_throttler:
-                value = await (
-                    await self.easee.get(
-                        f"/api/sessions/charger/{self.id}/total/{from_date.isoformat()}/{to_date.isoformat()}"
-                    )
-                ).text()
-                return float(value)
+            throttler = self.easee.get_throttler("consumption between dates", self.id, rate_limit=10, period=3600)
+            value = await (
+                await self.easee.get(
+                    f"/api/sessions/charger/{self.id}/total/{from_date.isoformat()}/{to_date.isoformat()}",
+                    throttler=throttler,
+                )
+            ).text()
+            return float(value)
         except ServerFailureException:
             return None
 
     async def get_hourly_consumption_between_dates(self, from_date: datetime, to_date: datetime):
         """Gets hourly consumption between two dates
         Note when calling: Seems to be capped at requesting max one month at a time
+        With a history store on the Easee object only the hours not stored yet are fetched
         """
+        history = self.easee.history_store
+        if history is None:
+            return await self._fetch_hourly_consumption(from_date, to_date)
+        return await history.sync(
+            HOURLY_USAGE,
+            self.id,
+            from_date,
+            to_date,
+            self._fetch_hourly_consumption,
+            lambda record: parse_timestamp(record["from"]).timestamp(),
+        )
+
+    async def _fetch_hourly_consumption(self, from_date: datetime, to_date: datetime):
         try:
             value = await (
                 await self.easee.get(
@@ -280,25 +398,67 @@ class Charger(BaseDict):
             return None
 
     async def get_sessions_between_dates(self, from_date: datetime, to_date):
-        """Gets charging sessions between two dates"""
-        try:
-            async with self._sessions_between_dates_throttler:
-                sessions = await (
-                    await self.easee.get(
-                        f"/api/sessions/charger/{self.id}/sessions/{from_date.isoformat()}/{to_date.isoformat()}"
-                    )
-                ).json()
-                sessions = [ChargerSession(session) for session in sessions]
-                sessions.sort(key=lambda x: x["carConnected"], reverse=True)
-                return sessions
+        """Gets charging sessions between two dates
+        With a history store on the Easee object only sessions not stored yet are fetched
+        """
+        history = self.easee.history_store
+        if history is None:
+            sessions = await self._fetch_sessions(from_date, to_date)
+        else:
+            sessions = await history.sync(
+                SESSIONS,
+                self.id,
+                from_date,
+                to_date,
+                self._fetch_sessions,
+                lambda record: parse_timestamp(record["carConnected"]).timestamp(),
+                _open_session_start,
+            )
+        if sessions is None:
+            return None
+        sessions = [ChargerSession(session) for session in sessions]
+        sessions.sort(key=lambda x: x["carConnected"], reverse=True)
+        return sessions
+
+    async def iter_sessions_between_dates(
+        self, from_date: datetime, to_date: datetime, window: timedelta | None = None
+    ) -> AsyncIterator[ChargerSession]:
+        """Gets charging sessions between two dates oldest first, fetching one window at a time
+        The window is a calendar month by default, the API returns at most about a month per request.
+        Only one window of sessions is in memory at once. Raises ServerFailureException if a window
+        can not be fetched, instead of leaving a gap
+        """
+        for start, end in split_date_range(from_date, to_date, window):
+            sessions = await self.get_sessions_between_dates(start, end)
+            if sessions is None:
+                raise ServerFailureException(f"Could not get sessions for {self.id} between {start} and {end}")
+            # Only keep the sessions starting in the window, so sessions on the window edges are not repeated
+            window_start = to_epoch(start)
+            window_end = to_epoch(end)
+            started = [(parse_timestamp(s.get_data()["carConnected"]).timestamp(), s) for s in sessions]
+            started = [item for item in started if window_start <= item[0] < window_end]
+            started.sort(key=lambda item: item[0])
+            for _, session in started:
+                yield session
+
+    async def _fetch_sessions(self, from_date: datetime, to_date: datetime):
+        try:
+            throttler = self.easee.get_throttler("sessions between dates", self.id, rate_limit=10, period=3600)
+            return await (
+                await self.easee.get(
+                    f"/api/sessions/charger/{self.id}/sessions/{from_date.isoformat()}/{to_date.isoformat()}",
+                    throttler=throttler,
+                )
+            ).json()
         except ServerFailureException:
             return None
 
     async def get_config(self, from_cache=False, raw=False) -> ChargerConfig:
-        """get config for charger"""
+        """get config for charger, from_cache allows a recently fetched config to be returned from the response_cache"""
         try:
-            config = await (await self.easee.get(f"/api/chargers/{self.id}/config")).json()
-            return ChargerConfig(config, raw)
+            config = await (await self.easee.get(f"/api/chargers/{self.id}/config", from_cache=from_cache)).json()
+            self.config = ChargerConfig(config, raw)
+            return self.config
         except ServerFailureException:
             return None
 
@@ -306,10 +466,40 @@ class Charger(BaseDict):
         """get state for charger"""
         try:
             state = await (await self.easee.get(f"/api/chargers/{self.id}/state")).json()
-            return ChargerState(state, raw)
+            self.state = ChargerState(state, raw)
+            return self.state
+        except ServerFailureException:
+            return None
+
+    async def get_compact_state(self) -> CompactChargerState:
+        """get state for charger with raw values as a CompactChargerState, e.g. for keeping many snapshots"""
+        try:
+            return CompactChargerState(await (await self.easee.get(f"/api/chargers/{self.id}/state")).json())
         except ServerFailureException:
             return None
 
+    async def get_compact_config(self, from_cache=False) -> CompactChargerConfig:
+        """get config for charger with raw values as a CompactChargerConfig"""
+        try:
+            config = await (await self.easee.get(f"/api/chargers/{self.id}/config", from_cache=from_cache)).json()
+            return CompactChargerConfig(config)
+        except ServerFailureException:
+            return None
+
+    def get_stream_state(self) -> Dict[str, Any]:
+        """Latest values received on the SignalR stream keyed by ChargerStreamData name, needs sr_subscribe"""
+        return self.easee.sr_state.snapshot(self.id)
+
+    def update_from_site_state(self, site_state: Any, raw=False) -> bool:
+        """Set state and config from a SiteState, returns False if the charger is not in it"""
+        state = site_state.get_charger_state(self.id, raw)
+        config = site_state.get_charger_config(self.id, raw)
+        if state is None or config is None:
+            return False
+        self.state = state
+        self.config = config
+        return True
+
     async def empty_config(self, raw=False) -> ChargerConfig:
         """Create an empty config data structure"""
         config = {}
@@ -406,8 +596,9 @@ class Charger(BaseDict):
             plan = None
 
         if plan is not None:
-            plan["isEnabled"] = enable
-            json = plan
+            # Copy, the decoded response is shared with other callers
+            json = copy.deepcopy(plan)
+            json["isEnabled"] = enable
 
             try:
                 return await self.easee.post(f"/api/chargers/{self.id}/basic_charge_plan", json=json)
@@ -458,7 +649,8 @@ class Charger(BaseDict):
                 ],
             }
         else:
-            json = plan
+            # Copy, the decoded response is shared with other callers
+            json = copy.deepcopy(plan)
             json["isEnabled"] = enabled
             days = json["days"]
             newdays = []
@@ -501,7 +693,8 @@ class Charger(BaseDict):
             return None
 
         if plan is not None:
-            json = plan
+            # Copy, the decoded response is shared with other callers
+            json = copy.deepcopy(plan)
             json["isEnabled"] = enable
 
             try:
@@ -727,7 +920,9 @@ class Charger(BaseDict):
             enablestr = "OcppOff"
         json = {"connectivityMode": enablestr, "websocketConnectionArgs": {"url": url}}
         try:
-            result = await (await self.easee.post(f"/local-ocpp/v1/connection-details/{self.id}", json=json)).json()
+            result = await (await self.easee.post(f"/local-ocpp/v1/connection-details/{self.id}", json=json)).json(
+                loads=self.easee._json_loads
+            )
             return result["version"]
         except ServerFailureException:
             return None
@@ -736,6 +931,8 @@ class Charger(BaseDict):
         """Applies a stored OCPP config of the charger"""
         json = {"version": version}
         try:
-            return await (await self.easee.post(f"/local-ocpp/v1/connections/chargers/{self.id}", json=json)).json()
+            return await (await self.easee.post(f"/local-ocpp/v1/connections/chargers/{self.id}", json=json)).json(
+                loads=self.easee._json_loads
+            )
         except ServerFailureException:
             return None
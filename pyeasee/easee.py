@@ -2,11 +2,15 @@
 Main client for the Eesee account.
 """
 
+from array import array
 import asyncio
-from datetime import datetime, timedelta
+import copy
+from datetime import datetime, timedelta, timezone
+from functools import partial
+import json
 import logging
 import ssl
-from typing import Any, AsyncIterator, Dict, List
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple
 
 import aiohttp
 import pysignalr
@@ -15,6 +19,7 @@ from pysignalr.exceptions import AuthorizationError
 from pysignalr.messages import CompletionMessage
 import websockets.asyncio.client
 
+from .cache import ResponseCache, ValidatorStore
 from .charger import Charger
 from .exceptions import (
     AuthorizationFailedException,
@@ -24,9 +29,29 @@ from .exceptions import (
     ServerFailureException,
     TooManyRequestsException,
 )
+from .history import HistoryStore
+from .response import BufferedResponse
+from .retry import DEFAULT_RETRY_POLICY, RetryPolicy
+from .series import HourlySeries, _require_numpy
 from .site import Site, SiteState
+from .stream import (
+    HashRing,
+    StreamDispatcher,
+    StreamMirror,
+    StreamShard,
+    StreamSubscription,
+    SubscriptionRegistry,
+)
 from .throttler import Throttler
-from .utils import convert_stream_data
+from .token_store import TokenStore
+from .utils import (
+    bounded_as_completed,
+    convert_stream_data,
+    default_json_dumps,
+    default_json_loads,
+    parse_timestamp,
+    split_date_range,
+)
 
 __VERSION__ = "0.8.17"
 
@@ -36,8 +61,15 @@ SR_MIN_BACKOFF = 0
 SR_MAX_BACKOFF = 300
 SR_INC_BACKOFF = 30
 
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=60, connect=15, sock_read=30)
+
+TOKEN_REFRESH_MARGIN = 60
+TOKEN_RETRY_DELAY = 30
+# Tokens living shorter than the refresh margin are not renewed more often than this
+TOKEN_MIN_REFRESH_DELAY = 30
 
-async def raise_for_status(response):
+
+async def raise_for_status(response, loads=json.loads):
     if 400 <= response.status:
         e = aiohttp.ClientResponseError(
             response.request_info,
@@ -47,7 +79,7 @@ async def raise_for_status(response):
         )
 
         if "json" in response.headers.get("CONTENT-TYPE", ""):
-            data = await response.json()
+            data = await response.json(loads=loads)
             e.message = str(data)
         else:
             data = await response.text()
@@ -79,6 +111,10 @@ async def raise_for_status(response):
         return True
 
 
+def _request_key(url, kwargs):
+    return (url, repr(sorted(kwargs.items())))
+
+
 async def __aiter__(
     self: websockets.asyncio.client.connect,
 ) -> AsyncIterator[websockets.asyncio.client.ClientConnection]:
@@ -99,6 +135,25 @@ class Easee:
         session: aiohttp.ClientSession | None = None,
         user_agent=None,
         ssl: ssl.SSLContext | None = None,
+        auto_refresh_token: bool = True,
+        token_store: TokenStore | None = None,
+        retry_policy: RetryPolicy | None = None,
+        coalesce_requests: bool = True,
+        response_cache: ResponseCache | None = None,
+        conditional_requests: bool = True,
+        connection_limit: int = 100,
+        connection_limit_per_host: int = 0,
+        keepalive_timeout: float = 15,
+        dns_cache_ttl: int | None = 10,
+        timeout: aiohttp.ClientTimeout | None = None,
+        max_parallel_requests: int = 4,
+        json_loads: Callable[[str | bytes], Any] | None = None,
+        json_dumps: Callable[[Any], str | bytes] | None = None,
+        history_store: HistoryStore | None = None,
+        sr_max_queue: int = 1000,
+        sr_overflow: str = "block",
+        sr_coalesce_window: float = 0,
+        sr_shards: int = 1,
     ):
         self.username = username
         self.password = password
@@ -114,6 +169,24 @@ class Easee:
         self.base = "https://api.easee.com"
         self.sr_base = "https://streams.easee.com/hubs/chargers"
         self.token = {}
+        self._token_lock = asyncio.Lock()
+        self._auto_refresh_token = auto_refresh_token
+        self._token_refresh_task = None
+        self._token_store = token_store
+        self.retry_policy = retry_policy if retry_policy is not None else DEFAULT_RETRY_POLICY
+        self._coalesce_requests = coalesce_requests
+        self._inflight_gets = {}
+        self._coalesce_hits = 0
+        self._coalesce_misses = 0
+        # Opt-in, without a cache every GET goes to the API
+        self.response_cache = response_cache
+        # Validators are kept apart from the cache, so GETs are conditional with or without one
+        self._validators = ValidatorStore() if conditional_requests else None
+        self._background_tasks = set()
+        self.max_parallel_requests = max_parallel_requests
+        self._json_loads = json_loads or default_json_loads
+        self._json_dumps = json_dumps or default_json_dumps
+        self.history_store = history_store
         self.get_headers = {
             "User-Agent": f"pyeasee/{__VERSION__} REST client{append_user_agent}",
             "Accept": "application/json",
@@ -129,20 +202,37 @@ class Easee:
             "Accept": "application/json",
             "Content-Type": "application/json;charset=UTF-8",
         }
+        # The connection options only apply to the session we create ourselves, a timeout
+        # given together with an external session is applied per request instead.
+        # TCP_NODELAY is always set by aiohttp on its connections.
         if session is None:
-            self.session = aiohttp.ClientSession()
+            connector = aiohttp.TCPConnector(
+                limit=connection_limit,
+                limit_per_host=connection_limit_per_host,
+                keepalive_timeout=keepalive_timeout,
+                use_dns_cache=dns_cache_ttl is not None,
+                ttl_dns_cache=dns_cache_ttl,
+            )
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout or DEFAULT_TIMEOUT)
+            self._request_timeout = None
         else:
             self.session = session
+            self._request_timeout = timeout
 
-        self.sr_subscriptions = {}
-        self.sr_connection = None
-        self.sr_connected = False
-        self.sr_connect_in_progress = False
-        self._sr_backoff = SR_MIN_BACKOFF
-        self._sr_task = None
+        self.sr_subscriptions = SubscriptionRegistry()
+        self.sr_state = StreamMirror()
+        # Updates are handed to callbacks from a queue per product, so a slow callback does not hold up the stream
+        # With a coalescing window only the latest value of each field in the window is delivered
+        self._sr_dispatcher = StreamDispatcher(
+            self._sr_deliver, max_queue=sr_max_queue, overflow=sr_overflow, window=sr_coalesce_window
+        )
+        # Products are spread over sr_shards connections, so a reconnect only affects part of them
+        self._sr_shards = [StreamShard(index, SR_MIN_BACKOFF) for index in range(sr_shards)]
+        self._sr_ring = HashRing(sr_shards)
 
         self._general_throttler = Throttler(rate_limit=500, period=300, name="general")
-        self._sites_throttler = Throttler(rate_limit=10, period=3600, name="sites")
+        self._throttlers = {}
+        self._sites_throttler = self.get_throttler("sites", None, rate_limit=10, period=3600)
 
         # Override the __aiter__ method of the pysignalr.websocket Connect class
         pysignalr.websockets.asyncio.client.connect.__aiter__ = __aiter__  # type: ignore[method-assign]
@@ -150,80 +240,299 @@ class Easee:
     def base_uri(self):
         return self.base
 
-    async def post(self, url, **kwargs):
-        _LOGGER.debug("POST: %s (%s)", url, kwargs)
-        await self._verify_updated_token()
-        async with self._general_throttler:
-            response = await self.session.post(f"{self.base}{url}", headers=self.headers, **kwargs)
-        await self.check_status(response)
-        return response
+    def get_throttler(self, endpoint: str, product_id: Any, rate_limit: int, period: float) -> Throttler:
+        """
+        Get the throttler for an endpoint and product (None for account wide limits).
+        The throttler is shared by every object for the same product and has the general throttler as parent.
+        """
+        key = (endpoint, product_id)
+        if key not in self._throttlers:
+            name = endpoint if product_id is None else f"{endpoint} {product_id}"
+            self._throttlers[key] = Throttler(
+                rate_limit=rate_limit, period=period, name=name, parent=self._general_throttler
+            )
+        return self._throttlers[key]
 
-    async def put(self, url, **kwargs):
-        _LOGGER.debug("PUT: %s (%s)", url, kwargs)
-        await self._verify_updated_token()
-        async with self._general_throttler:
-            response = await self.session.put(f"{self.base}{url}", headers=self.headers, **kwargs)
-        await self.check_status(response)
-        return response
+    # All request methods take an optional endpoint specific throttler from get_throttler,
+    # it has the general throttler as parent so both limits are applied to the request.
 
-    async def get(self, url, **kwargs):
-        _LOGGER.debug("GET: %s (%s)", url, kwargs)
-        await self._verify_updated_token()
-        async with self._general_throttler:
-            response = await self.session.get(f"{self.base}{url}", headers=self.get_headers, **kwargs)
-        await self.check_status(response)
-        return response
+    async def post(self, url, throttler: Throttler | None = None, **kwargs):
+        return await self._request("POST", url, self.headers, throttler, **kwargs)
+
+    async def put(self, url, throttler: Throttler | None = None, **kwargs):
+        return await self._request("PUT", url, self.headers, throttler, **kwargs)
+
+    async def get(self, url, throttler: Throttler | None = None, from_cache: bool = True, **kwargs) -> BufferedResponse:
+        """
+        GET a resource. When a response_cache is configured, urls with a cache policy are served from it when
+        from_cache is set, stale responses are returned while being refreshed in the background. Identical
+        concurrent requests share one HTTP call and one decoded JSON payload.
+        With conditional_requests, a GET of a url that last came with an ETag or Last-Modified header
+        sends If-None-Match or If-Modified-Since, also without a response_cache, and a 304 returns the
+        previous response.
+        Returns a BufferedResponse rather than an aiohttp ClientResponse, its body is already read.
+        """
+        policy = self.response_cache.policy(url) if self.response_cache is not None and not kwargs else None
+        entry = self.response_cache.get(url) if policy is not None else None
+        if entry is not None and from_cache and entry.is_usable():
+            if not entry.is_fresh():
+                self._revalidate(url, throttler)
+            _LOGGER.debug("GET: %s served from cache (age %d seconds)", url, entry.age())
+            return entry.response
 
-    async def delete(self, url, **kwargs):
-        _LOGGER.debug("DELETE: %s (%s)", url, kwargs)
-        await self._verify_updated_token()
-        async with self._general_throttler:
-            response = await self.session.delete(f"{self.base}{url}", headers=self.headers, **kwargs)
-        await self.check_status(response)
+        validators = self._validators if not kwargs else None
+        if entry is None and validators is not None:
+            entry = validators.get(url)
+        conditional_headers = entry.conditional_headers() if entry is not None else {}
+        response = await self._coalesced_get(url, throttler, conditional_headers, **kwargs)
+        if response.status == 304 and entry is not None:
+            _LOGGER.debug("GET: %s not modified", url)
+            entry.touch()
+            return entry.response
+        if policy is not None:
+            self.response_cache.put(url, response, policy)
+        if validators is not None:
+            validators.put(url, response)
         return response
 
+    def _revalidate(self, url, throttler):
+        """
+        Refresh a stale cache entry in the background - internal use only
+        """
+        if _request_key(url, {}) in self._inflight_gets:
+            return
+
+        async def revalidate():
+            try:
+                await self.get(url, throttler=throttler, from_cache=False)
+            except Exception as ex:
+                _LOGGER.debug("Background refresh of %s failed: %s: %s", url, type(ex).__name__, ex)
+
+        task = asyncio.create_task(revalidate(), name=f"pyeasee refresh {url}")
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _coalesced_get(self, url, throttler, conditional_headers, **kwargs) -> BufferedResponse:
+        headers = {**self.get_headers, **conditional_headers} if conditional_headers else self.get_headers
+        if not self._coalesce_requests:
+            return await self._request("GET", url, headers, throttler, buffered=True, **kwargs)
+
+        key = _request_key(url, kwargs)
+        inflight = self._inflight_gets.get(key)
+        if inflight is not None:
+            _LOGGER.debug("GET: %s joined in-flight request", url)
+            self._coalesce_hits += 1
+            return await asyncio.shield(inflight)
+
+        self._coalesce_misses += 1
+        inflight = asyncio.ensure_future(self._request("GET", url, headers, throttler, buffered=True, **kwargs))
+        self._inflight_gets[key] = inflight
+        inflight.add_done_callback(lambda task: self._inflight_done(key, task))
+        return await asyncio.shield(inflight)
+
+    def _inflight_done(self, key, task):
+        if self._inflight_gets.get(key) is task:
+            del self._inflight_gets[key]
+        if not task.cancelled():
+            # Retrieve the exception so it is not reported as never retrieved when all callers left
+            task.exception()
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        Connection pool limits and the number of connections in use and idle.
+        in_use and idle are read from private aiohttp connector attributes and are 0 if those change.
+        """
+        connector = self.session.connector if self.session is not None else None
+        if connector is None:
+            return {}
+        return {
+            "limit": connector.limit,
+            "limit_per_host": connector.limit_per_host,
+            "in_use": len(getattr(connector, "_acquired", ())),
+            "idle": sum(len(conns) for conns in getattr(connector, "_conns", {}).values()),
+        }
+
+    def get_coalescing_stats(self) -> Dict[str, int]:
+        """Number of GET requests that joined an in-flight request (hits) and that were sent (misses)"""
+        return {"hits": self._coalesce_hits, "misses": self._coalesce_misses}
+
+    def _timeout_kwargs(self) -> Dict[str, Any]:
+        """The timeout for a request on an external session, a session we created has it already"""
+        return {"timeout": self._request_timeout} if self._request_timeout is not None else {}
+
+    async def delete(self, url, throttler: Throttler | None = None, **kwargs):
+        return await self._request("DELETE", url, self.headers, throttler, **kwargs)
+
+    async def _request(self, method, url, headers, throttler, buffered=False, **kwargs):
+        """
+        Send a request, retrying rate limited and failed requests according to the retry policy.
+        If buffered the body is read within the retries and a BufferedResponse is returned.
+        """
+        _LOGGER.debug("%s: %s (%s)", method, url, kwargs)
+        kwargs = {**self._timeout_kwargs(), **kwargs}
+        if "json" in kwargs:
+            kwargs["data"] = self._json_dumps(kwargs.pop("json"))
+        attempt = 0
+        while True:
+            attempt += 1
+            await self._verify_updated_token()
+            try:
+                async with throttler or self._general_throttler:
+                    response = await self.session.request(method, f"{self.base}{url}", headers=headers, **kwargs)
+                await self.check_status(response)
+                if method != "GET" and self.response_cache is not None:
+                    self.response_cache.invalidate(url)
+                if buffered:
+                    return await BufferedResponse.from_response(response, self._json_loads)
+                return response
+            except (
+                TooManyRequestsException,
+                ServerFailureException,
+                aiohttp.ClientConnectionError,
+                aiohttp.ClientPayloadError,
+                asyncio.TimeoutError,
+            ) as ex:
+                delay = self.retry_policy.get_delay(method, attempt, ex)
+                if delay is None:
+                    raise
+                _LOGGER.info(
+                    "%s %s failed (%s), retry %d in %.1f seconds", method, url, type(ex).__name__, attempt, delay
+                )
+                await asyncio.sleep(delay)
+
     async def check_status(self, response):
         try:
-            await raise_for_status(response)
+            await raise_for_status(response, self._json_loads)
         except (AuthorizationFailedException, BadRequestException):
             _LOGGER.debug("Re authorizing due to 401")
-            await self.connect()
+            await self._reconnect(response.request_info.headers.get("Authorization"))
             # rethrow it
-            await raise_for_status(response)
+            await raise_for_status(response, self._json_loads)
         except ForbiddenServiceException:
             raise
         except Exception as ex:
             _LOGGER.debug("Got other exception from status: %s", type(ex).__name__)
             raise
 
-    async def _verify_updated_token(self):
-        """
-        Make sure there is a valid token
-        """
-        if "accessToken" not in self.token:
-            await self.connect()
-        _LOGGER.debug(
-            "verify_updated_token: %s, %s, %s",
-            self.token["expires"],
-            datetime.now(),
-            self.token["expires"] < datetime.now(),
-        )
-        if self.token["expires"] < datetime.now():
-            await self._refresh_token()
+    def _token_expired(self):
+        return self.token["expires"] < datetime.now()
+
+    def _set_auth_headers(self):
         accessToken = self.token["accessToken"]
         self.headers["Authorization"] = f"Bearer {accessToken}"
         self.get_headers["Authorization"] = f"Bearer {accessToken}"
         self.sr_headers["Authorization"] = f"Bearer {accessToken}"
 
+    async def _verify_updated_token(self):
+        """
+        Make sure there is a valid token. Only one login or refresh runs at a time,
+        concurrent callers wait for it and share the result.
+        """
+        if "accessToken" not in self.token or self._token_expired():
+            async with self._token_lock:
+                # Another caller may have renewed the token while we were waiting for the lock
+                if "accessToken" not in self.token and not await self._load_token():
+                    await self.connect()
+                _LOGGER.debug(
+                    "verify_updated_token: %s, %s, %s",
+                    self.token["expires"],
+                    datetime.now(),
+                    self._token_expired(),
+                )
+                if self._token_expired():
+                    await self._refresh_token()
+        self._set_auth_headers()
+        self._start_token_refresher()
+
+    async def _reconnect(self, failed_auth=None):
+        """
+        Get a new token after the API rejected failed_auth, unless another caller already did
+        """
+        async with self._token_lock:
+            if failed_auth is not None and failed_auth != f"Bearer {self.token.get('accessToken')}":
+                _LOGGER.debug("Token already renewed by another request")
+                return
+            await self.connect()
+        self._set_auth_headers()
+
+    def _start_token_refresher(self):
+        if self._auto_refresh_token is False or self._token_refresh_task is not None:
+            return
+        self._token_refresh_task = asyncio.create_task(self._token_refresh_loop(), name="pyeasee token refresh task")
+
+    async def _token_refresh_loop(self):
+        """
+        Renew the token shortly before it expires so requests never wait for it - internal use only
+        """
+        while True:
+            delay = (self.token["expires"] - datetime.now()).total_seconds() - TOKEN_REFRESH_MARGIN
+            delay = max(delay, TOKEN_MIN_REFRESH_DELAY)
+            _LOGGER.debug("Next token refresh in %d seconds", delay)
+            await asyncio.sleep(delay)
+            try:
+                async with self._token_lock:
+                    if self.token["expires"] - datetime.now() < timedelta(seconds=TOKEN_REFRESH_MARGIN):
+                        await self._refresh_token()
+                self._set_auth_headers()
+            except Exception as ex:
+                _LOGGER.warning(
+                    "Token refresh failed: %s: %s. Retry in %d seconds", type(ex).__name__, ex, TOKEN_RETRY_DELAY
+                )
+                await asyncio.sleep(TOKEN_RETRY_DELAY)
+
+    async def _stop_token_refresher(self):
+        if self._token_refresh_task is not None:
+            self._token_refresh_task.cancel()
+            try:
+                await self._token_refresh_task
+            except asyncio.CancelledError:
+                _LOGGER.debug("Token refresh task cancelled")
+        self._token_refresh_task = None
+
     async def _handle_token_response(self, res):
         """
         Handle the token request and set new datetime when it expires
         """
-        self.token = await res.json()
+        self.token = await res.json(loads=self._json_loads)
         _LOGGER.debug("TOKEN: %s", self.token)
         expiresIn = int(self.token["expiresIn"]) - 60
         now = datetime.now()
         self.token["expires"] = now + timedelta(0, expiresIn)
+        await self._save_token()
+
+    async def _load_token(self):
+        """
+        Load a previously saved token from the token store, returns True if one was found
+        """
+        if self._token_store is None:
+            return False
+        try:
+            data = await asyncio.to_thread(self._token_store.load)
+            if data is None or data.get("userName") != self.username:
+                return False
+            token = {**data["token"]}
+            token["expires"] = datetime.fromisoformat(token["expires"])
+        except Exception as ex:
+            _LOGGER.warning("Could not load stored token: %s: %s", type(ex).__name__, ex)
+            return False
+        _LOGGER.debug("Loaded stored token, expires %s", token["expires"])
+        self.token = token
+        return True
+
+    async def _save_token(self):
+        """
+        Save the current token to the token store
+        """
+        if self._token_store is None:
+            return
+        data = {
+            "userName": self.username,
+            "token": {**self.token, "expires": self.token["expires"].isoformat()},
+        }
+        try:
+            await asyncio.to_thread(self._token_store.save, data)
+        except Exception as ex:
+            _LOGGER.warning("Could not save token: %s: %s", type(ex).__name__, ex)
 
     async def connect(self):
         """
@@ -231,8 +540,13 @@ class Easee:
         """
         data = {"userName": self.username, "password": self.password}
         _LOGGER.debug("getting token for user: %s", self.username)
-        response = await self.session.post(f"{self.base}/api/accounts/login", headers=self.minimal_headers, json=data)
-        await raise_for_status(response)
+        response = await self.session.post(
+            f"{self.base}/api/accounts/login",
+            headers=self.minimal_headers,
+            data=self._json_dumps(data),
+            **self._timeout_kwargs(),
+        )
+        await raise_for_status(response, self._json_loads)
         await self._handle_token_response(response)
 
     async def _refresh_token(self):
@@ -246,9 +560,12 @@ class Easee:
         _LOGGER.debug("Refreshing access token")
         try:
             res = await self.session.post(
-                f"{self.base}/api/accounts/refresh_token", headers=self.minimal_headers, json=data
+                f"{self.base}/api/accounts/refresh_token",
+                headers=self.minimal_headers,
+                data=self._json_dumps(data),
+                **self._timeout_kwargs(),
             )
-            await raise_for_status(res)
+            await raise_for_status(res, self._json_loads)
             await self._handle_token_response(res)
         except (AuthorizationFailedException, BadRequestException):
             _LOGGER.debug("Could not get new access token from refresh token, getting new one")
@@ -256,37 +573,61 @@ class Easee:
 
     async def close(self):
         """
-        Close the underlying aiohttp session
+        Close the underlying aiohttp session and the history store
         """
+        await self._stop_token_refresher()
+        for task in list(self._background_tasks):
+            task.cancel()
+
         if self.session and self.external_session is False:
             await self.session.close()
             self.session = None
 
         await self._sr_disconnect()
+        await self._sr_dispatcher.close()
+
+        if self.history_store is not None:
+            await asyncio.to_thread(self.history_store.close)
+
+    def _sr_next(self, shard: StreamShard):
+        if shard.backoff < SR_MAX_BACKOFF:
+            shard.backoff = shard.backoff + SR_INC_BACKOFF
+        return shard.backoff
 
-    def _sr_next(self):
-        if self._sr_backoff < SR_MAX_BACKOFF:
-            self._sr_backoff = self._sr_backoff + SR_INC_BACKOFF
-        return self._sr_backoff
+    def _sr_shard(self, product_id: str) -> StreamShard:
+        return self._sr_shards[self._sr_ring.get(product_id)]
 
-    async def _sr_open_cb(self) -> None:
+    def _sr_shard_products(self, shard: StreamShard) -> List[str]:
+        return [product_id for product_id in self.sr_subscriptions if self._sr_shard(product_id) is shard]
+
+    async def _sr_open_cb(self, shard: StreamShard) -> None:
         """
         Signalr connected callback - called from signalr thread, internal use only
         """
-        _LOGGER.info("SR stream connected")
-        self._sr_backoff = SR_MIN_BACKOFF
-        self.sr_connected = True
+        _LOGGER.info("SR stream %d connected", shard.index)
+        shard.backoff = SR_MIN_BACKOFF
+        shard.connected = True
+        shard.connected_since = datetime.now(timezone.utc)
+        shard.connects += 1
+
+        await self._sr_send_subscribe(shard, self._sr_shard_products(shard))
 
-        for id in self.sr_subscriptions:
-            _LOGGER.debug("Subscribing to %s", id)
-            await self.sr_connection.send("SubscribeWithCurrentState", [id, True])
+    async def _sr_send_subscribe(self, shard: StreamShard, product_ids: List[str]) -> None:
+        """
+        Subscribe to products on the live connection, sending all calls at once - internal use only
+        """
+        _LOGGER.debug("Subscribing to %s", ", ".join(product_ids))
+        await asyncio.gather(
+            *[shard.connection.send("SubscribeWithCurrentState", [product_id, True]) for product_id in product_ids]
+        )
 
-    async def _sr_close_cb(self) -> None:
+    async def _sr_close_cb(self, shard: StreamShard) -> None:
         """
         Signalr disconnected callback - called from signalr thread, internal use only
         """
-        _LOGGER.error("SR stream disconnected or failed to connect")
-        self.sr_connected = False
+        _LOGGER.error("SR stream %d disconnected or failed to connect", shard.index)
+        shard.connected = False
+        shard.connected_since = None
 
     async def _sr_error_cb(self, message: CompletionMessage) -> None:
         _LOGGER.error("SR error recevied {message.error}")
@@ -297,120 +638,237 @@ class Easee:
         """
         self._sr_last_data = datetime.now()
         for data in stuff:
-            await self._sr_callback(data)
+            if self.sr_subscriptions.targets(data["mid"], data["id"], data["dataType"]):
+                # The mirror follows the stream here, not in the workers, so slow callbacks and dropped
+                # or coalesced queue entries do not leave it behind
+                data["value"] = convert_stream_data(data["dataType"], data["value"])
+                self.sr_state.update(data["mid"], data["id"], data["value"])
+                await self._sr_dispatcher.put(data["mid"], data)
+            elif data["mid"] not in self.sr_subscriptions:
+                _LOGGER.error("No callback found for '%s'", data["mid"])
 
-    async def _sr_command_response_cb(self, stuff: List[Dict[str, Any]]) -> None:
+    async def _sr_deliver(self, product_id: str, stuff: List[Dict[str, Any]]) -> None:
         """
-        Signalr command response callback - called from signalr thread, internal use only
+        Signalr dispatcher worker callback, updates of one product in order, values already converted and
+        mirrored - internal use only
         """
-        _LOGGER.debug("CommandResponse: %s", stuff)
+        batches = {}
+        for data in stuff:
+            # Subscriptions can have changed while the update was queued
+            targets = self.sr_subscriptions.targets(product_id, data["id"], data["dataType"])
+            if not targets:
+                continue
+            value = data["value"]
+            for subscription in targets:
+                if subscription.batch:
+                    batches.setdefault(subscription, []).append((data["dataType"], data["id"], value))
+                else:
+                    await self._sr_call(subscription, product_id, data["dataType"], data["id"], value)
+        for subscription, updates in batches.items():
+            await self._sr_call(subscription, product_id, updates)
 
-    async def _sr_callback(self, stuff: List[Dict[str, Any]]):
+    async def _sr_call(self, subscription: StreamSubscription, *args) -> None:
         """
-        Signalr callback handler - internal use only
+        Call a subscriber, a failing subscriber does not stop the others - internal use only
         """
-        if stuff["mid"] in self.sr_subscriptions:
-            callback = self.sr_subscriptions[stuff["mid"]]
-            value = convert_stream_data(stuff["dataType"], stuff["value"])
-            await callback(stuff["mid"], stuff["dataType"], stuff["id"], value)
-        else:
-            _LOGGER.error("No callback found for '%s'", stuff["mid"])
+        try:
+            await subscription.callback(*args)
+        except Exception:
+            _LOGGER.exception("SR callback %s failed", subscription)
+
+    def get_stream_queue_stats(self) -> Dict[str, Dict[str, int]]:
+        """Depth, max depth, delivered, dropped and coalesced updates of the stream queue of each product"""
+        return self._sr_dispatcher.get_queue_stats()
 
-    async def _sr_connect(self, start_delay=0):
+    async def _sr_command_response_cb(self, stuff: List[Dict[str, Any]]) -> None:
+        """
+        Signalr command response callback - called from signalr thread, internal use only
+        """
+        _LOGGER.debug("CommandResponse: %s", stuff)
+
+    async def _sr_connect(self, shard: StreamShard, start_delay=0):
         """
         Signalr connect - internal use only
         """
-        if self.sr_connect_in_progress is True:
-            _LOGGER.debug("SR already connecting")
+        if shard.connect_in_progress is True:
+            _LOGGER.debug("SR %d already connecting", shard.index)
             return
-        self.sr_connect_in_progress = True
+        shard.connect_in_progress = True
 
-        _LOGGER.debug(f"SR connect sleep {start_delay}")
+        _LOGGER.debug(f"SR {shard.index} connect sleep {start_delay}")
         await asyncio.sleep(start_delay)
 
-        self._sr_task = asyncio.create_task(self._sr_connect_loop(), name="pyeasee signalr task")
+        shard.task = asyncio.create_task(self._sr_connect_loop(shard), name=f"pyeasee signalr task {shard.index}")
 
-    async def _sr_connect_loop(self):
+    async def _sr_connect_loop(self, shard: StreamShard):
         """
         Signalr connect loop - internal use only
         """
-        if self.sr_connection is not None:
+        if shard.connection is not None:
             return
 
-        _LOGGER.debug("SR connect loop")
+        _LOGGER.debug("SR %d connect loop", shard.index)
 
         while True:
             try:
                 await self._verify_updated_token()
-                self.sr_connection = SignalRClient(self.sr_base, headers=self.sr_headers, ssl=self._ssl)
-                self.sr_connection.on_open(self._sr_open_cb)
-                self.sr_connection.on_close(self._sr_close_cb)
-                self.sr_connection.on_error(self._sr_error_cb)
-                self.sr_connection.on("ProductUpdate", self._sr_product_update_cb)
-                self.sr_connection.on("CommandResponse", self._sr_command_response_cb)
-                _LOGGER.debug("SR run")
-                await self.sr_connection.run()
+                shard.connection = SignalRClient(self.sr_base, headers=self.sr_headers, ssl=self._ssl)
+                shard.connection.on_open(partial(self._sr_open_cb, shard))
+                shard.connection.on_close(partial(self._sr_close_cb, shard))
+                shard.connection.on_error(self._sr_error_cb)
+                shard.connection.on("ProductUpdate", self._sr_product_update_cb)
+                shard.connection.on("CommandResponse", self._sr_command_response_cb)
+                _LOGGER.debug("SR %d run", shard.index)
+                await shard.connection.run()
             except AuthorizationError as ex:
-                self.sr_connected = False
-                backoff = self._sr_next()
-                _LOGGER.error("SR authentication failed: %s. Retry in %d seconds", type(ex).__name__, backoff)
+                shard.connected = False
+                shard.failures += 1
+                shard.last_error = type(ex).__name__
+                backoff = self._sr_next(shard)
+                _LOGGER.error(
+                    "SR %d authentication failed: %s. Retry in %d seconds", shard.index, type(ex).__name__, backoff
+                )
                 await asyncio.sleep(backoff)
-                await self._refresh_token()
+                async with self._token_lock:
+                    await self._refresh_token()
                 continue
             except Exception as ex:
-                self.sr_connected = False
-                backoff = self._sr_next()
-                _LOGGER.error("SR start exception: %s: %s. Retry in %d seconds", type(ex).__name__, ex, backoff)
+                shard.connected = False
+                shard.failures += 1
+                shard.last_error = f"{type(ex).__name__}: {ex}"
+                backoff = self._sr_next(shard)
+                _LOGGER.error(
+                    "SR %d start exception: %s: %s. Retry in %d seconds", shard.index, type(ex).__name__, ex, backoff
+                )
                 await asyncio.sleep(backoff)
                 continue
             except asyncio.CancelledError:
-                _LOGGER.debug("SR task cancelled (self)")
+                _LOGGER.debug("SR %d task cancelled (self)", shard.index)
 
             break
 
-        self.sr_connect_in_progress = False
+        shard.connect_in_progress = False
 
     def sr_is_connected(self):
-        return self.sr_connected
+        """True if every connection carrying subscriptions is connected"""
+        used = [shard for shard in self._sr_shards if self._sr_shard_products(shard)]
+        if not used:
+            return any(shard.connected for shard in self._sr_shards)
+        return all(shard.connected for shard in used)
+
+    # Attributes of the single connection before sharding, kept for compatibility. Setting them changes
+    # the first connection, which is the only one with the default sr_shards=1
+
+    @property
+    def sr_connected(self) -> bool:
+        return self.sr_is_connected()
+
+    @sr_connected.setter
+    def sr_connected(self, connected: bool):
+        self._sr_shards[0].connected = connected
 
-    async def sr_subscribe(self, product, callback):
+    @property
+    def sr_connection(self) -> SignalRClient | None:
+        return self._sr_shards[0].connection
+
+    @sr_connection.setter
+    def sr_connection(self, connection: SignalRClient | None):
+        self._sr_shards[0].connection = connection
+
+    @property
+    def sr_connect_in_progress(self) -> bool:
+        return self._sr_shards[0].connect_in_progress
+
+    @sr_connect_in_progress.setter
+    def sr_connect_in_progress(self, in_progress: bool):
+        self._sr_shards[0].connect_in_progress = in_progress
+
+    def get_stream_status(self) -> Dict[str, Any]:
+        """Health of each SignalR connection with its number of products, and the overall state"""
+        shards = []
+        for shard in self._sr_shards:
+            status = shard.status()
+            status["products"] = len(self._sr_shard_products(shard))
+            shards.append(status)
+        return {
+            "connected": self.sr_is_connected(),
+            "products": len(self.sr_subscriptions),
+            "shards": shards,
+        }
+
+    async def sr_subscribe(self, product, callback, batch=False, data_ids=None, data_types=None) -> StreamSubscription:
         """
         Subscribe to signalr events for product, callback will be called as async callback(product_id, data_type, data_id, value)
+        With batch=True callback is called once per batch of updates as async callback(product_id, updates),
+        updates being a list of (data_type, data_id, value), use this together with sr_coalesce_window
+        data_ids (ChargerStreamData or EqualizerStreamData members or ids) and data_types (DatatypesStreamData
+        members or ids) limit the updates the callback gets. A product can have many subscriptions, only the
+        first one subscribes on the stream, later ones can read the current values from sr_state.
+        Returns the subscription, pass it to sr_unsubscribe to remove only this callback.
         """
-        if product.id in self.sr_subscriptions:
-            return
+        return (await self.sr_subscribe_many([product], callback, batch, data_ids, data_types))[0]
 
-        _LOGGER.debug("Subscribing to %s", product.id)
-        self.sr_subscriptions[product.id] = callback
-        if self.sr_connected is True:
-            await self.sr_connection.send("SubscribeWithCurrentState", [product.id, True])
-        else:
-            await self._sr_connect()
+    async def sr_subscribe_many(
+        self, products, callback, batch=False, data_ids=None, data_types=None
+    ) -> List[StreamSubscription]:
+        """
+        Subscribe callback to signalr events for several products at once, see sr_subscribe.
+        Only products without subscriptions are subscribed on the stream, in one batch of calls.
+        """
+        subscriptions = []
+        new_product_ids = {}
+        for product in products:
+            subscription = StreamSubscription(product.id, callback, data_ids, data_types, batch)
+            if self.sr_subscriptions.add(subscription):
+                new_product_ids.setdefault(self._sr_shard(product.id), []).append(product.id)
+            subscriptions.append(subscription)
+        for shard, product_ids in new_product_ids.items():
+            if shard.connected is True:
+                await self._sr_send_subscribe(shard, product_ids)
+            else:
+                # All current subscriptions of the shard are sent when its connection opens
+                await self._sr_connect(shard)
+        return subscriptions
 
     async def sr_unsubscribe(self, product):
         """
-        Unsubscribe from signalr events for product
-        BUG: Does not work
+        Unsubscribe from signalr events for product, or remove one subscription returned by sr_subscribe.
+        The product is unsubscribed on the live connection when its last subscription is removed.
         """
-        _LOGGER.debug("Unsubscribing from %s", product.id)
-        if product.id in self.sr_subscriptions:
-            del self.sr_subscriptions[product.id]
-            await self._sr_disconnect()
-            await self._sr_connect()
+        if isinstance(product, StreamSubscription):
+            product_id = product.product_id
+            if not self.sr_subscriptions.remove(product):
+                return
+        else:
+            product_id = product.id
+            if not self.sr_subscriptions.remove_product(product_id):
+                return
+        _LOGGER.debug("Unsubscribing from %s", product_id)
+        self.sr_state.clear(product_id)
+        await self._sr_dispatcher.discard(product_id)
+        shard = self._sr_shard(product_id)
+        if shard.connected is True:
+            try:
+                await shard.connection.send("Unsubscribe", [product_id])
+            except Exception as ex:
+                # The product is left out when the connection is opened again
+                _LOGGER.debug("SR unsubscribe from %s failed: %s: %s", product_id, type(ex).__name__, ex)
 
     async def _sr_disconnect(self):
         """
-        Disconnect the signalr stream - internal use only
+        Disconnect all signalr streams - internal use only
         """
-        if self._sr_task is not None:
-            self._sr_task.cancel()
-            try:
-                await self._sr_task
-            except asyncio.CancelledError:
-                _LOGGER.debug("SR task cancelled")
-        self._sr_task = None
-        self.sr_connection = None
-        self.sr_connect_in_progress = False
+        for shard in self._sr_shards:
+            if shard.task is not None:
+                shard.task.cancel()
+                try:
+                    await shard.task
+                except asyncio.CancelledError:
+                    _LOGGER.debug("SR %d task cancelled", shard.index)
+            shard.task = None
+            shard.connection = None
+            shard.connected = False
+            shard.connect_in_progress = False
 
     async def get_chargers(self) -> List[Charger]:
         """
@@ -426,38 +884,126 @@ class Easee:
     async def get_site(self, id: int) -> Site:
         """get site by id"""
         try:
-            async with self._sites_throttler:
-                data = await (await self.get(f"/api/sites/{id}?detailed=true")).json()
+            data = await (await self.get(f"/api/sites/{id}?detailed=true", throttler=self._sites_throttler)).json()
             _LOGGER.debug("Site:  %s", data)
-            return Site(data, self)
+            # Deep copy, the payload may be shared with other callers and Site and its circuits can be changed
+            return Site(copy.deepcopy(data), self)
         except ServerFailureException:
             return None
 
+    async def _get_product_site(self, record: Dict[str, Any]) -> Site:
+        site = await self.get_site(record["id"])
+        if site is not None:
+            site["circuits"] = record["circuits"]
+            site["equalizers"] = record["equalizers"]
+        return site
+
+    async def _load_sites(self, records, loader) -> List[Site]:
+        sites = [None] * len(records)
+        async for index, site in bounded_as_completed(loader, records, self.max_parallel_requests):
+            sites[index] = site
+        return sites
+
     async def get_sites(self) -> List[Site]:
         """Get all sites"""
         try:
             records = await (await self.get("/api/sites")).json()
             _LOGGER.debug("Sites:  %s", records)
-            sites = await asyncio.gather(*[self.get_site(r["id"]) for r in records])
-            return sites
+            return await self._load_sites([r["id"] for r in records], self.get_site)
         except ServerFailureException:
             return None
 
+    async def iter_sites(self) -> AsyncIterator[Site]:
+        """Get all sites, each site is yielded as soon as it is loaded"""
+        try:
+            records = await (await self.get("/api/sites")).json()
+        except ServerFailureException:
+            return
+        _LOGGER.debug("Sites:  %s", records)
+        async for _, site in bounded_as_completed(
+            self.get_site, [r["id"] for r in records], self.max_parallel_requests
+        ):
+            yield site
+
     async def get_account_products(self) -> List[Site]:
         """Get all sites and products that are accessible by the logged in user"""
         try:
             records = await (await self.get("/api/accounts/products")).json()
             _LOGGER.debug("Sites:  %s", records)
-            sites = []
-            for r in records:
-                site = await self.get_site(r["id"])
-                site["circuits"] = r["circuits"]
-                site["equalizers"] = r["equalizers"]
-                sites.append(site)
-            return sites
+            return await self._load_sites(records, self._get_product_site)
         except ServerFailureException:
             return None
 
+    async def iter_account_products(self) -> AsyncIterator[Site]:
+        """Get all sites and products that are accessible by the logged in user, yielded as they are loaded"""
+        try:
+            records = await (await self.get("/api/accounts/products")).json()
+        except ServerFailureException:
+            return
+        _LOGGER.debug("Sites:  %s", records)
+        async for _, site in bounded_as_completed(self._get_product_site, records, self.max_parallel_requests):
+            yield site
+
+    async def iter_hourly_consumption(
+        self, chargers: List[Charger], from_date: datetime, to_date: datetime
+    ) -> AsyncIterator[Tuple[Charger, Dict[str, Any]]]:
+        """
+        Get hourly consumption for chargers between two dates, the range can be of any length.
+        The range is split into month windows which are fetched concurrently, at most max_parallel_requests
+        at once. Yields (charger, hourly record) ordered by time and then by the order of chargers.
+        Raises ServerFailureException if a window cannot be fetched, instead of leaving a gap.
+        """
+        windows = split_date_range(from_date, to_date)
+        jobs = [(window, position, charger) for window in windows for position, charger in enumerate(chargers)]
+
+        async def fetch(job):
+            (start, end), _, charger = job
+            records = await charger.get_hourly_consumption_between_dates(start, end)
+            if records is None:
+                raise ServerFailureException(
+                    f"Could not get hourly consumption for {charger.id} between {start} and {end}"
+                )
+            # Only keep the hours starting in the window, so hours on the window edges are not repeated
+            start_utc = start if start.tzinfo else start.replace(tzinfo=timezone.utc)
+            end_utc = end if end.tzinfo else end.replace(tzinfo=timezone.utc)
+            return [r for r in records if start_utc <= parse_timestamp(r["from"]) < end_utc]
+
+        # Windows complete roughly in order, results are held back until all chargers of the earliest
+        # window are done so the output is ordered
+        results = {}
+        window_size = len(chargers)
+        next_window = 0
+        async for index, records in bounded_as_completed(fetch, jobs, self.max_parallel_requests):
+            results[index] = records
+            while next_window < len(windows) and all(
+                i in results for i in range(next_window * window_size, (next_window + 1) * window_size)
+            ):
+                merged = []
+                for i in range(next_window * window_size, (next_window + 1) * window_size):
+                    _, position, charger = jobs[i]
+                    merged.extend((parse_timestamp(r["from"]), position, charger, r) for r in results.pop(i))
+                merged.sort(key=lambda item: item[:2])
+                for _, _, charger, record in merged:
+                    yield charger, record
+                next_window += 1
+
+    async def get_hourly_series(self, chargers: List[Charger], from_date: datetime, to_date: datetime) -> HourlySeries:
+        """
+        Hourly consumption of several chargers as one HourlySeries, fetched like iter_hourly_consumption.
+        The records go straight into arrays, so long ranges across many chargers keep no dict per hour.
+        """
+        # Fail before fetching anything
+        _require_numpy()
+        positions = {charger.id: position for position, charger in enumerate(chargers)}
+        timestamps = array("q")
+        energy = array("d")
+        codes = array("i")
+        async for charger, record in self.iter_hourly_consumption(chargers, from_date, to_date):
+            timestamps.append(int(parse_timestamp(record["from"]).timestamp()))
+            energy.append(record["totalEnergy"] or 0.0)
+            codes.append(positions[charger.id])
+        return HourlySeries(timestamps, energy, [charger.id for charger in chargers], codes)
+
     async def get_site_state(self, id: str) -> SiteState:
         """Get site state"""
         try:
@@ -7,7 +7,10 @@ class NotFoundException(Exception):
 
 
 class TooManyRequestsException(Exception):
-    pass
+    @property
+    def retry_after(self):
+        """Value of the Retry-After header, None if not sent"""
+        return self.args[1] if len(self.args) > 1 else None
 
 
 class ServerFailureException(Exception):
@@ -0,0 +1,146 @@
+"""
+Resumable export of charging sessions to NDJSON or CSV files
+"""
+
+import asyncio
+import csv
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict
+
+from .utils import split_date_range
+
+_LOGGER = logging.getLogger(__name__)
+
+SESSION_FIELDS = ["carConnected", "carDisconnected", "kiloWattHours"]
+
+
+class NdjsonWriter:
+    """One JSON object per line"""
+
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, record: Dict[str, Any]):
+        self.file.write(json.dumps(record) + "\n")
+
+
+class CsvWriter:
+    """CSV with a header line, written when the file is empty"""
+
+    def __init__(self, file, fields=SESSION_FIELDS):
+        self.file = file
+        self._writer = csv.DictWriter(file, fieldnames=fields, extrasaction="ignore")
+        if file.tell() == 0:
+            self._writer.writeheader()
+
+    def write(self, record: Dict[str, Any]):
+        self._writer.writerow(record)
+
+
+WRITERS = {"ndjson": NdjsonWriter, "csv": CsvWriter}
+
+
+def _load_checkpoint(path: str) -> Dict[str, Any] | None:
+    try:
+        with open(path, "r") as checkpoint_file:
+            return json.load(checkpoint_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as ex:
+        _LOGGER.warning("Could not read checkpoint %s, starting over: %s", path, ex)
+        return None
+
+
+def _save_checkpoint(path: str, data: Dict[str, Any]):
+    fd, tmp_path = tempfile.mkstemp(prefix=".easee-export-", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "w") as checkpoint_file:
+            json.dump(data, checkpoint_file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _remove_checkpoint(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _open_output(path: str, offset: int):
+    if offset == 0:
+        return open(path, "w", newline="", encoding="utf-8")
+    # Drop anything written after the last checkpoint, it is written again
+    output = open(path, "r+", newline="", encoding="utf-8")
+    output.truncate(offset)
+    output.seek(offset)
+    return output
+
+
+def _write_window(output, writer, records, checkpoint_path: str, checkpoint: Dict[str, Any]):
+    for record in records:
+        writer.write(record)
+    output.flush()
+    os.fsync(output.fileno())
+    checkpoint["offset"] = output.tell()
+    _save_checkpoint(checkpoint_path, checkpoint)
+
+
+async def export_sessions(
+    charger,
+    from_date: datetime,
+    to_date: datetime,
+    path: str,
+    format: str = "ndjson",
+    checkpoint_path: str | None = None,
+    window: timedelta | None = None,
+) -> int:
+    """
+    Write the charging sessions of a charger between two dates to path, oldest first, as "ndjson" or "csv".
+    Sessions are fetched and written one window at a time, a calendar month by default or window long like
+    in iter_sessions_between_dates. Progress is saved in checkpoint_path, path + ".checkpoint" by default,
+    after each window, so calling this again with the same arguments after an interruption continues where
+    it stopped. The checkpoint is removed when the export is complete.
+    Returns the number of sessions written by this call.
+    """
+    if format not in WRITERS:
+        raise ValueError(f"Unknown format {format}, use one of {', '.join(WRITERS)}")
+    checkpoint_path = checkpoint_path or f"{path}.checkpoint"
+    export = {
+        "charger": charger.id,
+        "from": from_date.isoformat(),
+        "to": to_date.isoformat(),
+        "format": format,
+        "window": window.total_seconds() if window is not None else None,
+    }
+
+    checkpoint = await asyncio.to_thread(_load_checkpoint, checkpoint_path)
+    if checkpoint is not None and checkpoint.get("export") != export:
+        _LOGGER.warning("Checkpoint %s is for another export, starting over", checkpoint_path)
+        checkpoint = None
+    if checkpoint is None:
+        checkpoint = {"export": export, "next": from_date.isoformat(), "offset": 0}
+    else:
+        _LOGGER.info("Resuming export of %s from %s", charger.id, checkpoint["next"])
+
+    written = 0
+    output = await asyncio.to_thread(_open_output, path, checkpoint["offset"])
+    try:
+        writer = WRITERS[format](output)
+        for start, end in split_date_range(datetime.fromisoformat(checkpoint["next"]), to_date, window):
+            sessions = charger.iter_sessions_between_dates(start, end, window)
+            records = [{**session.get_data()} async for session in sessions]
+            checkpoint["next"] = end.isoformat()
+            await asyncio.to_thread(_write_window, output, writer, records, checkpoint_path, checkpoint)
+            written += len(records)
+    finally:
+        await asyncio.to_thread(output.close)
+
+    await asyncio.to_thread(_remove_checkpoint, checkpoint_path)
+    return written
@@ -0,0 +1,197 @@
+"""
+Local store for historical data that does not change once complete
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Tuple
+
+from .utils import split_date_range
+
+_LOGGER = logging.getLogger(__name__)
+
+HOURLY_USAGE = "hourly_usage"
+SESSIONS = "sessions"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    kind TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    start REAL NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (kind, product_id, start)
+);
+CREATE TABLE IF NOT EXISTS complete (
+    kind TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS complete_product ON complete (kind, product_id, start);
+CREATE TABLE IF NOT EXISTS breakdowns (
+    site_id TEXT NOT NULL,
+    from_date TEXT NOT NULL,
+    to_date TEXT NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (site_id, from_date, to_date)
+);
+"""
+
+
+def to_epoch(value: datetime) -> float:
+    """Seconds since epoch, dates without timezone are UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def from_epoch(value: float) -> datetime:
+    return datetime.fromtimestamp(value, timezone.utc)
+
+
+class HistoryStore:
+    """
+    SQLite store for hourly usage, charging sessions and cost breakdowns.
+
+    For each charger it remembers which time windows are complete, i.e. old enough that the
+    API will not return anything new for them, so only missing windows and the still open tail
+    need to be fetched. Data younger than settle_time is never marked complete, to allow for
+    chargers reporting late. Use path=":memory:" for a store that only lives as long as the process.
+    """
+
+    def __init__(self, path: str = "easee-history.db", settle_time: timedelta = timedelta(hours=3)):
+        self.path = path
+        self.settle_time = settle_time
+        self._lock = threading.Lock()
+        # Queries run in a worker thread, the lock serializes access to the connection
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def settled_before(self) -> float:
+        """Data starting before this time is considered complete"""
+        return to_epoch(datetime.now(timezone.utc) - self.settle_time)
+
+    def _missing(self, kind: str, product_id: str, start: float, end: float) -> List[Tuple[float, float]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT start, end FROM complete WHERE kind = ? AND product_id = ? AND end > ? AND start < ? "
+                "ORDER BY start",
+                (kind, product_id, start, end),
+            ).fetchall()
+        gaps = []
+        position = start
+        for complete_start, complete_end in rows:
+            if complete_start > position:
+                gaps.append((position, complete_start))
+            position = max(position, complete_end)
+        if position < end:
+            gaps.append((position, end))
+        return gaps
+
+    def _add(self, kind: str, product_id: str, records: List[Tuple[float, Dict[str, Any]]]):
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO records (kind, product_id, start, record) VALUES (?, ?, ?, ?)",
+                [(kind, product_id, start, json.dumps(record)) for start, record in records],
+            )
+
+    def _mark_complete(self, kind: str, product_id: str, start: float, end: float):
+        with self._lock, self._db:
+            # Merge with overlapping or adjacent windows so lookups stay short
+            rows = self._db.execute(
+                "SELECT rowid, start, end FROM complete WHERE kind = ? AND product_id = ? AND end >= ? AND start <= ?",
+                (kind, product_id, start, end),
+            ).fetchall()
+            for rowid, complete_start, complete_end in rows:
+                start = min(start, complete_start)
+                end = max(end, complete_end)
+                self._db.execute("DELETE FROM complete WHERE rowid = ?", (rowid,))
+            self._db.execute(
+                "INSERT INTO complete (kind, product_id, start, end) VALUES (?, ?, ?, ?)",
+                (kind, product_id, start, end),
+            )
+
+    def _records(self, kind: str, product_id: str, start: float, end: float) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT record FROM records WHERE kind = ? AND product_id = ? AND start >= ? AND start < ? "
+                "ORDER BY start",
+                (kind, product_id, start, end),
+            ).fetchall()
+        return [json.loads(record) for (record,) in rows]
+
+    def _get_breakdown(self, site_id: str, from_date: str, to_date: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT record FROM breakdowns WHERE site_id = ? AND from_date = ? AND to_date = ?",
+                (site_id, from_date, to_date),
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def _put_breakdown(self, site_id: str, from_date: str, to_date: str, record):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO breakdowns (site_id, from_date, to_date, record) VALUES (?, ?, ?, ?)",
+                (site_id, from_date, to_date, json.dumps(record)),
+            )
+
+    async def missing(self, kind: str, product_id: str, start: float, end: float) -> List[Tuple[float, float]]:
+        """Windows between start and end (epoch seconds) that are not complete"""
+        return await asyncio.to_thread(self._missing, kind, str(product_id), start, end)
+
+    async def add(self, kind: str, product_id: str, records: List[Tuple[float, Dict[str, Any]]]):
+        """Store (start, record) pairs, replacing records with the same start"""
+        await asyncio.to_thread(self._add, kind, str(product_id), records)
+
+    async def mark_complete(self, kind: str, product_id: str, start: float, end: float):
+        """Remember that all records between start and end are stored"""
+        await asyncio.to_thread(self._mark_complete, kind, str(product_id), start, end)
+
+    async def records(self, kind: str, product_id: str, start: float, end: float) -> List[Dict[str, Any]]:
+        """Stored records starting between start and end, ordered by start"""
+        return await asyncio.to_thread(self._records, kind, str(product_id), start, end)
+
+    async def get_breakdown(self, site_id: Any, from_date: datetime, to_date: datetime):
+        """Stored cost breakdown for exactly this range, None if not stored"""
+        return await asyncio.to_thread(self._get_breakdown, str(site_id), from_date.isoformat(), to_date.isoformat())
+
+    async def put_breakdown(self, site_id: Any, from_date: datetime, to_date: datetime, record):
+        """Store a cost breakdown, only call this for ranges that are complete"""
+        await asyncio.to_thread(self._put_breakdown, str(site_id), from_date.isoformat(), to_date.isoformat(), record)
+
+    async def sync(
+        self, kind: str, product_id: str, from_date: datetime, to_date: datetime, fetch, start_of, complete_before=None
+    ) -> List[Dict[str, Any]] | None:
+        """
+        Get the records between two dates, fetching only the windows that are not complete, a calendar month
+        per request.
+        fetch(from_date, to_date) gets records from the API, None on failure. start_of(record) gives the
+        record start in epoch seconds. complete_before(records) can limit how far a fetched window is
+        marked complete, e.g. before a session that is still open.
+        """
+        start = to_epoch(from_date)
+        end = to_epoch(to_date)
+        for gap_start, gap_end in await self.missing(kind, product_id, start, end):
+            # The API returns at most about a month per request
+            for window_start, window_end in split_date_range(from_epoch(gap_start), from_epoch(gap_end)):
+                _LOGGER.debug("Fetching %s for %s from %s to %s", kind, product_id, window_start, window_end)
+                records = await fetch(window_start, window_end)
+                if records is None:
+                    return None
+                await self.add(kind, product_id, [(start_of(record), record) for record in records])
+                complete_start = to_epoch(window_start)
+                complete_end = min(to_epoch(window_end), self.settled_before())
+                if complete_before is not None:
+                    complete_end = min(complete_end, complete_before(records))
+                if complete_end > complete_start:
+                    await self.mark_complete(kind, product_id, complete_start, complete_end)
+        return await self.records(kind, product_id, start, end)
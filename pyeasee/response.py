@@ -0,0 +1,53 @@
+"""
+Buffered API responses
+"""
+
+import json
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+_UNSET = object()
+
+
+class BufferedResponse:
+    """
+    A response with the body already read, so it can be shared between callers.
+    The body is decoded once and every caller gets the same decoded object, treat it as read only.
+    Easee.get returns this instead of an aiohttp ClientResponse, read, text and json take the same
+    arguments as there.
+    """
+
+    def __init__(self, status: int, headers, url, body: bytes, loads=json.loads):
+        self.status = status
+        self.headers = headers
+        self.url = url
+        self._body = body
+        self._loads = loads
+        self._json = _UNSET
+
+    @classmethod
+    async def from_response(cls, response, loads=json.loads):
+        body = await response.read()
+        return cls(response.status, response.headers, response.url, body, loads)
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: str | None = None, errors: str = "strict") -> str:
+        return self._body.decode(encoding or "utf-8", errors)
+
+    async def json(self, *, encoding: str | None = None, loads=None, content_type: str | None = "application/json"):
+        """
+        The decoded body. content_type is accepted for compatibility with aiohttp and not checked.
+        A loads other than the client's gets the body as text, like in aiohttp, and returns a private copy.
+        """
+        if loads is not None and loads is not self._loads:
+            return loads(self._body.decode(encoding or "utf-8")) if self._body.strip() else None
+        if self._json is _UNSET:
+            self._json = self._loads(self._body) if self._body.strip() else None
+        return self._json
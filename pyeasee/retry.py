@@ -0,0 +1,90 @@
+"""
+Retry policy for API calls
+"""
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import logging
+import random
+
+from .exceptions import TooManyRequestsException
+
+_LOGGER = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(["GET", "PUT", "DELETE"])
+
+
+def parse_retry_after(value) -> float | None:
+    """Parse a Retry-After header, either delay seconds or a HTTP date, into seconds from now"""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryPolicy:
+    """
+    Decides if and when a failed request is retried.
+
+    Rate limited requests (429) were not processed by the server and are retried after Retry-After if
+    the server sent it, for all methods unless retry_rate_limited_writes is False, then only for
+    idempotent methods. A Retry-After longer than max_retry_after gives up instead of waiting.
+    Server failures (5xx), connection errors and timeouts are only retried for idempotent methods,
+    using capped exponential backoff with full jitter.
+    A request is tried at most max_attempts times, max_attempts=1 disables retries.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        max_retry_after: float = 300.0,
+        idempotent_methods=IDEMPOTENT_METHODS,
+        retry_rate_limited_writes: bool = True,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.idempotent_methods = idempotent_methods
+        self.retry_rate_limited_writes = retry_rate_limited_writes
+
+    def backoff(self, attempt: int) -> float:
+        """Jittered delay before retry number attempt"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def get_delay(self, method: str, attempt: int, exception: Exception) -> float | None:
+        """Seconds to wait before retrying after attempt failed with exception, None to give up"""
+        if attempt >= self.max_attempts:
+            return None
+        idempotent = method.upper() in self.idempotent_methods
+        if isinstance(exception, TooManyRequestsException):
+            if not idempotent and not self.retry_rate_limited_writes:
+                return None
+            retry_after = parse_retry_after(exception.retry_after)
+            if retry_after is None:
+                return self.backoff(attempt)
+            if retry_after > self.max_retry_after:
+                _LOGGER.debug("Retry-After %f seconds is too long, giving up", retry_after)
+                return None
+            return retry_after
+        if not idempotent:
+            return None
+        return self.backoff(attempt)
+
+
+# Used when Easee is not given a policy: a few quick retries of reads and other idempotent requests,
+# commands are sent once so a call never waits for minutes
+DEFAULT_RETRY_POLICY = RetryPolicy(
+    max_attempts=3, max_delay=10.0, max_retry_after=30.0, retry_rate_limited_writes=False
+)
@@ -0,0 +1,164 @@
+"""
+Columnar hourly usage, needs numpy
+"""
+
+from array import array
+import logging
+from typing import Any, Dict, Iterable, List
+
+from .utils import parse_timestamp
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+_LOGGER = logging.getLogger(__name__)
+
+PERIODS = ("hour", "day", "week", "month")
+
+SECONDS_PER_DAY = 86400
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("HourlySeries requires numpy, install pyeasee[series]")
+
+
+def _bucket(timestamps, period: str, utc_offset: int):
+    """Start of the period each timestamp falls in, counted in local time utc_offset seconds from UTC"""
+    local = timestamps + utc_offset
+    if period == "hour":
+        start = local - local % 3600
+    elif period == "day":
+        start = local - local % SECONDS_PER_DAY
+    elif period == "week":
+        days = local // SECONDS_PER_DAY
+        # 1970-01-01 was a Thursday, weeks start on Monday
+        start = (days - (days + 3) % 7) * SECONDS_PER_DAY
+    elif period == "month":
+        start = local.astype("datetime64[s]").astype("datetime64[M]").astype("datetime64[s]").astype(np.int64)
+    else:
+        raise ValueError(f"Unknown period {period}, use one of {', '.join(PERIODS)}")
+    return start - utc_offset
+
+
+class HourlySeries:
+    """
+    Hourly energy as columns instead of a list of dicts: start of each hour as int64 epoch seconds,
+    energy in kWh as float64 and, for series covering several chargers, the index of the charger
+    in products as int32. Aggregations return a new series where timestamps are the period starts.
+    """
+
+    __slots__ = ("timestamps", "energy", "products", "product_codes")
+
+    def __init__(self, timestamps, energy, products: List[str] | None = None, product_codes=None):
+        _require_numpy()
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.energy = np.asarray(energy, dtype=np.float64)
+        self.products = products
+        self.product_codes = None if product_codes is None else np.asarray(product_codes, dtype=np.int32)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]], product_id: str | None = None):
+        """Series from the records of get_hourly_consumption_between_dates"""
+        _require_numpy()
+        timestamps = array("q")
+        energy = array("d")
+        for record in records:
+            timestamps.append(int(parse_timestamp(record["from"]).timestamp()))
+            energy.append(record["totalEnergy"] or 0.0)
+        if product_id is None:
+            return cls(timestamps, energy)
+        return cls(timestamps, energy, [product_id], np.zeros(len(timestamps), dtype=np.int32))
+
+    @classmethod
+    def concat(cls, series: List["HourlySeries"]):
+        """One series from several, e.g. one per charger"""
+        _require_numpy()
+        products = []
+        codes = []
+        for part in series:
+            if part.products is None:
+                raise ValueError("Only series with products can be concatenated")
+            # Map the codes of each part to the merged product list
+            mapping = np.array([_index(products, product) for product in part.products], dtype=np.int32)
+            codes.append(mapping[part.product_codes] if len(mapping) else part.product_codes)
+        return cls(
+            np.concatenate([part.timestamps for part in series]) if series else [],
+            np.concatenate([part.energy for part in series]) if series else [],
+            products,
+            np.concatenate(codes) if codes else [],
+        )
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __repr__(self):
+        return f"<HourlySeries {len(self)} rows, {self.total():.3f} kWh>"
+
+    def total(self) -> float:
+        return float(self.energy.sum())
+
+    def for_product(self, product_id: str) -> "HourlySeries":
+        """The rows of one charger"""
+        mask = self.product_codes == self.products.index(product_id)
+        return HourlySeries(self.timestamps[mask], self.energy[mask], [product_id], np.zeros(mask.sum(), np.int32))
+
+    def sum_by_timestamp(self) -> "HourlySeries":
+        """Sum of all chargers per hour, e.g. the consumption of a site"""
+        timestamps, inverse = np.unique(self.timestamps, return_inverse=True)
+        return HourlySeries(timestamps, np.bincount(inverse, weights=self.energy, minlength=len(timestamps)))
+
+    def resample(self, period: str = "day", utc_offset: int = 0) -> "HourlySeries":
+        """
+        Sum per hour, day, week (starting Monday) or month, keeping chargers apart.
+        Periods are in local time utc_offset seconds from UTC, daylight saving changes are not followed.
+        """
+        buckets = _bucket(self.timestamps, period, utc_offset)
+        if self.product_codes is None:
+            timestamps, inverse = np.unique(buckets, return_inverse=True)
+            return HourlySeries(timestamps, np.bincount(inverse, weights=self.energy, minlength=len(timestamps)))
+        keys, inverse = np.unique(np.stack([self.product_codes, buckets]), axis=1, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        energy = np.bincount(inverse, weights=self.energy, minlength=keys.shape[1])
+        return HourlySeries(keys[1], energy, self.products, keys[0])
+
+    def peaks(self, count: int = 1) -> "HourlySeries":
+        """The count rows with the highest energy, highest first"""
+        count = min(count, len(self))
+        if count <= 0:
+            return self[np.zeros(0, dtype=np.int64)]
+        cut = len(self) - count
+        top = np.argpartition(self.energy, cut)[cut:]
+        return self[top[np.argsort(self.energy[top])[::-1]]]
+
+    def __getitem__(self, index):
+        """Rows selected by a numpy index, mask or slice"""
+        codes = None if self.product_codes is None else self.product_codes[index]
+        return HourlySeries(self.timestamps[index], self.energy[index], self.products, codes)
+
+    def to_arrow(self):
+        """pyarrow Table with columns timestamp, totalEnergy and, with products, productId"""
+        if pyarrow is None:
+            raise ImportError("to_arrow requires pyarrow, install pyeasee[arrow]")
+        columns = {
+            "timestamp": pyarrow.array(self.timestamps, type=pyarrow.timestamp("s", tz="UTC")),
+            "totalEnergy": pyarrow.array(self.energy, type=pyarrow.float64()),
+        }
+        if self.product_codes is not None:
+            columns["productId"] = pyarrow.DictionaryArray.from_arrays(
+                pyarrow.array(self.product_codes, type=pyarrow.int32()), pyarrow.array(self.products)
+            )
+        return pyarrow.table(columns)
+
+
+def _index(products: List[str], product: str) -> int:
+    if product not in products:
+        products.append(product)
+    return products.index(product)
@@ -4,7 +4,7 @@ from typing import Any, Dict, List
 
 from .charger import Charger, ChargerConfig, ChargerState
 from .exceptions import ForbiddenServiceException, ServerFailureException
-from .throttler import Throttler
+from .history import to_epoch
 from .utils import BaseDict
 
 _LOGGER = logging.getLogger(__name__)
@@ -29,7 +29,6 @@ class Equalizer(BaseDict):
         self.name: str = data["name"]
         self.site = site
         self.easee = easee
-        self._max_allocated_current_throttler = Throttler(rate_limit=1, period=60, name="max allocated current")
 
     async def get_observations(self, *args):
         """Gets observation IDs"""
@@ -47,6 +46,10 @@ class Equalizer(BaseDict):
         except ServerFailureException:
             return None
 
+    def get_stream_state(self) -> Dict[str, Any]:
+        """Latest values received on the SignalR stream keyed by EqualizerStreamData name, needs sr_subscribe"""
+        return self.easee.sr_state.snapshot(self.id)
+
     async def get_config(self):
         """Get Equalizer config"""
         try:
@@ -98,10 +101,10 @@ class Equalizer(BaseDict):
         }
 
         try:
-            async with self._max_allocated_current_throttler:
-                return await self.easee.post(
-                    f"/api/equalizers/{self.id}/commands/configure_max_allocated_current", json=json
-                )
+            throttler = self.easee.get_throttler("max allocated current", self.id, rate_limit=1, period=60)
+            return await self.easee.post(
+                f"/api/equalizers/{self.id}/commands/configure_max_allocated_current", json=json, throttler=throttler
+            )
         except ServerFailureException:
             return None
 
@@ -178,24 +181,55 @@ class SiteState(BaseDict):
 
     def __init__(self, data: Dict[str, Any]):
         super().__init__(data)
-
-    def get_charger_config(self, charger_id: str, raw=False) -> ChargerConfig:
-        """get config for charger from the instance data"""
+        self._circuit_index = None
+        self._charger_index = None
+        self._wrapped = {}
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._circuit_index = None
+        self._charger_index = None
+        self._wrapped = {}
+
+    def _build_index(self):
+        """Index circuits and chargers by id, built once per payload on first lookup"""
+        self._circuit_index = {}
+        self._charger_index = {}
         for circuit in self["circuitStates"]:
+            self._circuit_index[circuit["circuit"]["id"]] = circuit
             for charger_data in circuit["chargerStates"]:
-                if charger_data["chargerID"] == charger_id:
-                    return ChargerConfig(charger_data["chargerConfig"], raw)
+                self._charger_index[charger_data["chargerID"]] = charger_data
 
-        return None
+    def _get_charger_data(self, charger_id: str) -> Dict[str, Any]:
+        if self._charger_index is None:
+            self._build_index()
+        return self._charger_index.get(charger_id)
 
-    def get_charger_state(self, charger_id: str, raw=False) -> ChargerState:
-        """get state for charger from the instance data"""
-        for circuit in self["circuitStates"]:
-            for charger_data in circuit["chargerStates"]:
-                if charger_data["chargerID"] == charger_id:
-                    return ChargerState(charger_data["chargerState"], raw)
+    def get_circuit_state(self, circuit_id: int) -> Dict[str, Any]:
+        """get circuit and the state of its chargers from the instance data"""
+        if self._circuit_index is None:
+            self._build_index()
+        return self._circuit_index.get(circuit_id)
 
-        return None
+    def get_charger_config(self, charger_id: str, raw=False) -> ChargerConfig:
+        """get config for charger from the instance data, the returned object is shared by all callers"""
+        key = ("config", charger_id, raw)
+        if key not in self._wrapped:
+            charger_data = self._get_charger_data(charger_id)
+            if charger_data is None:
+                return None
+            self._wrapped[key] = ChargerConfig(charger_data["chargerConfig"], raw)
+        return self._wrapped[key]
+
+    def get_charger_state(self, charger_id: str, raw=False) -> ChargerState:
+        """get state for charger from the instance data, the returned object is shared by all callers"""
+        key = ("state", charger_id, raw)
+        if key not in self._wrapped:
+            charger_data = self._get_charger_data(charger_id)
+            if charger_data is None:
+                return None
+            self._wrapped[key] = ChargerState(charger_data["chargerState"], raw)
+        return self._wrapped[key]
 
 
 class Site(BaseDict):
@@ -206,7 +240,6 @@ class Site(BaseDict):
         self.id: int = data["id"]
         self.name: str = data["name"]
         self.easee = easee
-        self._breakdown_throttler = Throttler(rate_limit=10, period=3600, name="price breakdown")
 
     def get_circuits(self) -> List[Circuit]:
         """Get circuits for the site"""
@@ -216,6 +249,28 @@ class Site(BaseDict):
         """Get equalizers for the site"""
         return [Equalizer(e, self, self.easee) for e in self["equalizers"]]
 
+    def get_chargers(self) -> List[Charger]:
+        """Get chargers in all circuits of the site"""
+        return [charger for circuit in self.get_circuits() for charger in circuit.get_chargers()]
+
+    async def get_state(self) -> SiteState:
+        """Get the state of the site with state and config of all its chargers"""
+        return await self.easee.get_site_state(self.id)
+
+    async def refresh_chargers(self, chargers: List[Charger] = None, raw=False) -> List[Charger]:
+        """
+        Update state and config of chargers, all chargers of the site if not given, with a single site state request.
+        Chargers keep their previous state and config if the request fails.
+        """
+        if chargers is None:
+            chargers = self.get_chargers()
+        site_state = await self.get_state()
+        if site_state is not None:
+            for charger in chargers:
+                if not charger.update_from_site_state(site_state, raw):
+                    _LOGGER.debug("Charger %s not found in state of site %s", charger.id, self.id)
+        return chargers
+
     async def set_name(self, name: str):
         """Set name for the site"""
         json = {**self.get_data(), "name": name}
@@ -266,18 +321,28 @@ class Site(BaseDict):
             return None
 
     async def get_cost_between_dates(self, from_date: datetime, to_date: datetime):
-        """Get the charging cost between from_datetime and to_datetime"""
+        """Get the charging cost between from_datetime and to_datetime
+        With a history store on the Easee object, breakdowns for ranges that have ended are stored
+        """
+        history = self.easee.history_store
+        if history is not None:
+            costs = await history.get_breakdown(self.id, from_date, to_date)
+            if costs is not None:
+                return costs
 
         try:
-            async with self._breakdown_throttler:
-                costs = await (
-                    await self.easee.get(
-                        f"/api/sites/{self.id}/breakdown/{from_date.isoformat()}/{to_date.isoformat()}"
-                    )
-                ).json()
-            return costs
+            throttler = self.easee.get_throttler("price breakdown", self.id, rate_limit=10, period=3600)
+            costs = await (
+                await self.easee.get(
+                    f"/api/sites/{self.id}/breakdown/{from_date.isoformat()}/{to_date.isoformat()}",
+                    throttler=throttler,
+                )
+            ).json()
         except (ServerFailureException, ForbiddenServiceException):
             return None
+        if history is not None and to_epoch(to_date) <= history.settled_before():
+            await history.put_breakdown(self.id, from_date, to_date, costs)
+        return costs
 
     async def get_users(self):
         """Get a list of users connected to this site"""
@@ -0,0 +1,382 @@
+"""
+Handling of SignalR stream updates
+"""
+
+import asyncio
+import bisect
+from collections import deque
+from datetime import datetime, timezone
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Tuple
+
+from .utils import lookup_charger_stream_id, lookup_equalizer_stream_id
+
+_LOGGER = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "coalesce")
+
+
+def stream_field_name(product_id: str, data_id: int) -> str:
+    """Name of a stream field, from EqualizerStreamData for equalizers and ChargerStreamData otherwise"""
+    if product_id[0] == "Q":
+        name = lookup_equalizer_stream_id(data_id)
+    else:
+        name = lookup_charger_stream_id(data_id)
+    return name if name is not None else str(data_id)
+
+
+def _data_id(data_id) -> int:
+    """Accept a ChargerStreamData or EqualizerStreamData member as well as its value"""
+    return int(getattr(data_id, "value", data_id))
+
+
+class StreamMirror:
+    """
+    Latest value and update time of every field received on the SignalR stream, per product. Only fields
+    some subscription wants are kept.
+    Values are converted to their data type, times are when the update was received, in UTC.
+    """
+
+    def __init__(self):
+        self._products: Dict[str, Dict[int, Tuple[Any, datetime]]] = {}
+
+    def __contains__(self, product_id):
+        return product_id in self._products
+
+    def update(self, product_id: str, data_id: int, value: Any, timestamp: datetime | None = None):
+        fields = self._products.get(product_id)
+        if fields is None:
+            fields = self._products[product_id] = {}
+        fields[data_id] = (value, timestamp or datetime.now(timezone.utc))
+
+    def get(self, product_id: str, data_id, default=None):
+        """Latest value of one field, data_id is a stream data enum member or its value"""
+        field = self._products.get(product_id, {}).get(_data_id(data_id))
+        return default if field is None else field[0]
+
+    def last_update(self, product_id: str, data_id=None) -> datetime | None:
+        """When a field, or any field of the product if data_id is None, was last updated"""
+        fields = self._products.get(product_id)
+        if not fields:
+            return None
+        if data_id is None:
+            return max(timestamp for _, timestamp in fields.values())
+        field = fields.get(_data_id(data_id))
+        return None if field is None else field[1]
+
+    def snapshot(self, product_id: str) -> Dict[str, Any]:
+        """Copy of the latest values of a product keyed by field name, e.g. state_totalPower"""
+        fields = self._products.get(product_id, {})
+        return {stream_field_name(product_id, data_id): value for data_id, (value, _) in fields.items()}
+
+    def timestamps(self, product_id: str) -> Dict[str, datetime]:
+        """Last update time of each field of a product keyed by field name"""
+        fields = self._products.get(product_id, {})
+        return {stream_field_name(product_id, data_id): timestamp for data_id, (_, timestamp) in fields.items()}
+
+    def clear(self, product_id: str | None = None):
+        if product_id is None:
+            self._products.clear()
+        else:
+            self._products.pop(product_id, None)
+
+
+class StreamSubscription:
+    """
+    A callback subscribed to the stream of a product, returned by Easee.sr_subscribe.
+    data_ids and data_types limit the updates it gets, None means all.
+    """
+
+    __slots__ = ("product_id", "callback", "data_ids", "data_types", "batch")
+
+    def __init__(
+        self,
+        product_id: str,
+        callback: Callable[..., Awaitable[None]],
+        data_ids: Iterable | None = None,
+        data_types: Iterable | None = None,
+        batch: bool = False,
+    ):
+        self.product_id = product_id
+        self.callback = callback
+        self.data_ids = None if data_ids is None else frozenset(_data_id(d) for d in data_ids)
+        self.data_types = None if data_types is None else frozenset(_data_id(t) for t in data_types)
+        self.batch = batch
+
+    def __repr__(self):
+        return f"<StreamSubscription {self.product_id} {getattr(self.callback, '__name__', self.callback)}>"
+
+    def wants(self, data_id: int, data_type: int) -> bool:
+        if self.data_ids is not None and data_id not in self.data_ids:
+            return False
+        return self.data_types is None or data_type in self.data_types
+
+
+class SubscriptionRegistry:
+    """
+    Stream subscriptions per product. For each product a dispatch table maps (data id, data type)
+    to the subscriptions that want it, filled on first use and dropped when the subscriptions change.
+    """
+
+    def __init__(self):
+        self._subscriptions: Dict[str, List[StreamSubscription]] = {}
+        self._tables: Dict[str, Dict[Tuple[int, int], Tuple[StreamSubscription, ...]]] = {}
+
+    def __contains__(self, product_id):
+        return product_id in self._subscriptions
+
+    def __iter__(self):
+        """Subscribed product ids"""
+        return iter(list(self._subscriptions))
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def get(self, product_id: str) -> List[StreamSubscription]:
+        return list(self._subscriptions.get(product_id, []))
+
+    def add(self, subscription: StreamSubscription) -> bool:
+        """Add a subscription, returns True if it is the first for its product"""
+        subscriptions = self._subscriptions.setdefault(subscription.product_id, [])
+        subscriptions.append(subscription)
+        self._tables[subscription.product_id] = {}
+        return len(subscriptions) == 1
+
+    def remove(self, subscription: StreamSubscription) -> bool:
+        """Remove a subscription, returns True if it was the last for its product"""
+        subscriptions = self._subscriptions.get(subscription.product_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return False
+        subscriptions.remove(subscription)
+        if subscriptions:
+            self._tables[subscription.product_id] = {}
+            return False
+        del self._subscriptions[subscription.product_id]
+        del self._tables[subscription.product_id]
+        return True
+
+    def remove_product(self, product_id: str) -> bool:
+        """Remove all subscriptions of a product, returns True if there were any"""
+        self._tables.pop(product_id, None)
+        return self._subscriptions.pop(product_id, None) is not None
+
+    def targets(self, product_id: str, data_id: int, data_type: int) -> Tuple[StreamSubscription, ...]:
+        """The subscriptions that want an update"""
+        table = self._tables.get(product_id)
+        if table is None:
+            return ()
+        key = (data_id, data_type)
+        targets = table.get(key)
+        if targets is None:
+            targets = table[key] = tuple(s for s in self._subscriptions[product_id] if s.wants(data_id, data_type))
+        return targets
+
+
+class _ProductQueue:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        # Entries are one item lists so a coalesced update can replace the message in place
+        self.entries = deque()
+        self.latest = {}
+        self.not_empty = asyncio.Event()
+        self.not_full = asyncio.Event()
+        self.not_full.set()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.worker = None
+        self.max_depth = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def append(self, message: Dict[str, Any]):
+        entry = [message]
+        self.entries.append(entry)
+        self.latest[message["id"]] = entry
+        self.max_depth = max(self.max_depth, len(self.entries))
+        self.idle.clear()
+        self.not_empty.set()
+
+    def drop_oldest(self):
+        entry = self.entries.popleft()
+        if self.latest.get(entry[0]["id"]) is entry:
+            del self.latest[entry[0]["id"]]
+        self.dropped += 1
+
+    def take(self, latest_only: bool = False) -> List[Dict[str, Any]]:
+        messages = [entry[0] for entry in self.entries]
+        if latest_only:
+            # Keep the last update of each field, in the order of those last updates
+            fields = {}
+            for message in messages:
+                fields.pop(message["id"], None)
+                fields[message["id"]] = message
+            self.coalesced += len(messages) - len(fields)
+            messages = list(fields.values())
+        self.entries.clear()
+        self.latest.clear()
+        self.not_empty.clear()
+        self.not_full.set()
+        return messages
+
+
+class StreamDispatcher:
+    """
+    Hands stream updates to handler(product_id, messages) from a bounded queue per product, each drained
+    by its own worker task. A slow handler only delays its own product, updates of one product are handled
+    in order and different products in parallel. The worker takes everything queued at once, so messages
+    is a list of one or more updates.
+
+    When a queue holds max_queue updates, overflow decides what happens to a new one: "block" waits for
+    room, which holds up the stream reader, "drop_oldest" drops the oldest queued update and "coalesce"
+    replaces a queued update of the same field, dropping the oldest update if there is none.
+
+    With a window, in seconds, the worker waits that long after the first update of a batch and
+    then hands over only the latest update of each field received meanwhile.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[str, List[Dict[str, Any]]], Awaitable[None]],
+        max_queue: int = 1000,
+        overflow: str = "block",
+        window: float = 0,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow}, use one of {', '.join(OVERFLOW_POLICIES)}")
+        self.handler = handler
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.window = window
+        self._queues: Dict[str, _ProductQueue] = {}
+
+    async def put(self, product_id: str, message: Dict[str, Any]):
+        queue = self._queues.get(product_id)
+        if queue is None:
+            queue = self._queues[product_id] = _ProductQueue(self.max_queue)
+            queue.worker = asyncio.create_task(self._work(product_id, queue), name=f"pyeasee dispatch {product_id}")
+
+        if len(queue.entries) >= queue.maxsize:
+            if self.overflow == "block":
+                while len(queue.entries) >= queue.maxsize:
+                    queue.not_full.clear()
+                    await queue.not_full.wait()
+                    if self._queues.get(product_id) is not queue:
+                        # Discarded while waiting, the update is not wanted any more
+                        return
+            elif self.overflow == "coalesce" and message["id"] in queue.latest:
+                queue.latest[message["id"]][0] = message
+                queue.coalesced += 1
+                return
+            else:
+                queue.drop_oldest()
+        queue.append(message)
+
+    async def _work(self, product_id: str, queue: _ProductQueue):
+        while True:
+            await queue.not_empty.wait()
+            if self.window > 0:
+                await asyncio.sleep(self.window)
+            messages = queue.take(latest_only=self.window > 0)
+            try:
+                await self.handler(product_id, messages)
+            except Exception:
+                _LOGGER.exception("Stream handler failed for %s", product_id)
+            queue.delivered += len(messages)
+            if not queue.entries:
+                queue.idle.set()
+
+    async def join(self):
+        """Wait until every queued update has been handled"""
+        for queue in list(self._queues.values()):
+            await queue.idle.wait()
+
+    def get_queue_stats(self) -> Dict[str, Dict[str, int]]:
+        """Queue depth and counters per product"""
+        return {
+            product_id: {
+                "depth": len(queue.entries),
+                "max_depth": queue.max_depth,
+                "delivered": queue.delivered,
+                "dropped": queue.dropped,
+                "coalesced": queue.coalesced,
+            }
+            for product_id, queue in self._queues.items()
+        }
+
+    async def discard(self, product_id: str):
+        """Stop the worker of a product and drop its queued updates"""
+        queue = self._queues.pop(product_id, None)
+        if queue is not None:
+            queue.entries.clear()
+            queue.latest.clear()
+            # Wake up puts waiting for room, they return without queueing
+            queue.not_full.set()
+            await _cancel(queue.worker)
+
+    async def close(self):
+        for product_id in list(self._queues):
+            await self.discard(product_id)
+
+
+async def _cancel(task: asyncio.Task):
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode(), usedforsecurity=False).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of product ids onto shards. Every shard has replicas points on the ring and
+    a product goes to the shard of the next point, so changing the number of shards moves few products.
+    """
+
+    def __init__(self, shards: int, replicas: int = 64):
+        if shards < 1:
+            raise ValueError("At least one shard is needed")
+        points = sorted(
+            (_hash(f"shard-{shard}-{replica}"), shard) for shard in range(shards) for replica in range(replicas)
+        )
+        self._points = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def get(self, key: str) -> int:
+        """Shard index for key"""
+        return self._shards[bisect.bisect(self._points, _hash(key)) % len(self._points)]
+
+
+class StreamShard:
+    """Connection state of one of the SignalR connections, each with its own backoff and health"""
+
+    def __init__(self, index: int, backoff: float = 0):
+        self.index = index
+        self.connection = None
+        self.connected = False
+        self.connect_in_progress = False
+        self.backoff = backoff
+        self.task = None
+        self.connects = 0
+        self.failures = 0
+        self.last_error = None
+        self.connected_since = None
+
+    def __repr__(self):
+        return f"<StreamShard {self.index} {'connected' if self.connected else 'disconnected'}>"
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "connected": self.connected,
+            "connected_since": self.connected_since,
+            "connects": self.connects,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "backoff": self.backoff,
+        }
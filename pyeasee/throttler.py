@@ -12,12 +12,22 @@ _LOGGER = logging.getLogger(__name__)
 
 
 class Throttler:
-    def __init__(self, rate_limit: int, period: float = 1.0, name: str = ""):
+    """
+    Allows at most rate_limit calls in any window of period seconds.
+
+    Each call takes a token which is returned exactly one period after the call was scheduled.
+    Waiters are served in FIFO order and sleep exactly until their slot. A throttler with a
+    parent also takes a token from the parent for every call, at the same time as its own.
+    """
+
+    def __init__(self, rate_limit: int, period: float = 1.0, name: str = "", parent: "Throttler" = None):
         self.rate_limit = rate_limit
         self.period = period
         self.name = name
+        self.parent = parent
 
         self._task_logs: Deque[float] = deque()
+        self._lock = asyncio.Lock()
 
     def flush(self):
         now = time.monotonic()
@@ -27,19 +37,44 @@ class Throttler:
             else:
                 break
 
-    async def acquire(self):
+    def next_free(self) -> float:
+        """Earliest monotonic time a token is available, ignoring the parent"""
         self.flush()
+        free = time.monotonic()
+        if self._task_logs:
+            # Slots are handed out in order so the log stays sorted
+            free = max(free, self._task_logs[-1])
         if len(self._task_logs) >= self.rate_limit:
+            free = max(free, self._task_logs[-self.rate_limit] + self.period)
+        return free
+
+    def reserve(self, earliest: float = 0) -> float:
+        """Take a token from this throttler and its parents, returns the monotonic time it may be used"""
+        scheduled = max(earliest, self.next_free())
+        if self.parent is not None:
+            scheduled = self.parent.reserve(scheduled)
+        self._task_logs.append(scheduled)
+        return scheduled
+
+    async def _sleep_until(self, when: float):
+        delay = when - time.monotonic()
+        if delay > 0:
             _LOGGER.debug(
                 "Delay %f seconds due to throttling (%d calls per %f seconds allowed for %s).",
-                self.period / self.rate_limit,
+                delay,
                 self.rate_limit,
                 self.period,
                 self.name,
             )
-            await asyncio.sleep(self.period / self.rate_limit)
+            await asyncio.sleep(delay)
 
-        self._task_logs.append(time.monotonic())
+    async def acquire(self):
+        async with self._lock:
+            # Only the first waiter sleeps for our own limit, the rest queue behind it in order.
+            # Parents are reserved once we have a token, so a long wait here never holds a parent slot.
+            await self._sleep_until(self.next_free())
+            scheduled = self.reserve()
+        await self._sleep_until(scheduled)
 
     async def __aenter__(self):
         await self.acquire()
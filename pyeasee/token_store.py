@@ -0,0 +1,75 @@
+"""
+Persistent storage of access and refresh tokens
+"""
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, writes are still atomic but not serialized
+    fcntl = None
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TokenStore(ABC):
+    """Interface for token stores, implement load and save to keep tokens somewhere else"""
+
+    @abstractmethod
+    def load(self) -> Dict[str, Any] | None:
+        """Return the stored token data or None if there is none"""
+
+    @abstractmethod
+    def save(self, data: Dict[str, Any]):
+        """Store token data, must be JSON serializable"""
+
+
+class FileTokenStore(TokenStore):
+    """Token store backed by a JSON file, safe to share between processes"""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._lock_path = f"{self.path}.lock"
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self) -> Dict[str, Any] | None:
+        try:
+            # Writers replace the file atomically so a reader always sees a complete file
+            with open(self.path, "r") as token_file:
+                return json.load(token_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as ex:
+            _LOGGER.warning("Could not read token file %s: %s", self.path, ex)
+            return None
+
+    def save(self, data: Dict[str, Any]):
+        directory = os.path.dirname(self.path)
+        with self._locked():
+            fd, tmp_path = tempfile.mkstemp(prefix=".easee-token-", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as token_file:
+                    json.dump(data, token_file, indent=2)
+                    token_file.flush()
+                    os.fsync(token_file.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
@@ -1,9 +1,35 @@
+from array import array
+import asyncio
 from collections.abc import Mapping
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+import json
 import re
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, List, Tuple
 
 from .const import ChargerStreamData, EqualizerStreamData
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Fastest available JSON implementation, used unless Easee is given its own.
+# The encoder may return str or bytes.
+if orjson is not None:
+    default_json_loads = orjson.loads
+    default_json_dumps = orjson.dumps
+elif msgspec is not None:
+    default_json_loads = msgspec.json.decode
+    default_json_dumps = msgspec.json.encode
+else:
+    default_json_loads = json.loads
+    default_json_dumps = json.dumps
+
 regex = r"^(-?(?:[1-9][0-9]*)?[0-9]{4})-(1[0-2]|0[1-9])-(3[01]|0[1-9]|[12][0-9])T(2[0-3]|[01][0-9]):([0-5][0-9]):([0-5][0-9])(\.[0-9]+)?(Z|[+-](?:2[0-3]|[01][0-9]):[0-5][0-9])?$"
 match_iso8601 = re.compile(regex).match
 
@@ -38,6 +64,57 @@ def convert_stream_data(data_type, value):
     return value
 
 
+async def bounded_as_completed(
+    func: Callable[[Any], Awaitable[Any]], items: Iterable[Any], limit: int
+) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Run func(item) for every item with at most limit calls running at once.
+    Yields (index of item, result) as the calls complete. Calls still running are cancelled if
+    a call fails or the iteration is stopped.
+    """
+    items = enumerate(items)
+    pending = {}
+
+    def start_next():
+        for index, item in items:
+            pending[asyncio.ensure_future(func(item))] = index
+            return
+
+    try:
+        for _ in range(max(limit, 1)):
+            start_next()
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = pending.pop(task)
+                start_next()
+                yield index, task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def split_date_range(
+    from_date: datetime, to_date: datetime, window: timedelta | None = None
+) -> List[Tuple[datetime, datetime]]:
+    """Split a date range into windows of the given size, by default windows that end at calendar month boundaries"""
+    if window is not None and window <= timedelta(0):
+        raise ValueError("window must be positive")
+    windows = []
+    start = from_date
+    while start < to_date:
+        if window is not None:
+            end = start + window
+        elif start.month == 12:
+            end = start.replace(year=start.year + 1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        else:
+            end = start.replace(month=start.month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        end = min(end, to_date)
+        windows.append((start, end))
+        start = end
+    return windows
+
+
 def validate_iso8601(str_val):
     try:
         if match_iso8601(str_val) is not None:
@@ -47,24 +124,50 @@ def validate_iso8601(str_val):
     return False
 
 
+def parse_iso8601(str_val):
+    """Parse an ISO 8601 date string from the API, dates without timezone are UTC"""
+    try:
+        return datetime.fromisoformat(str_val).replace(tzinfo=timezone.utc)
+    except ValueError:
+        try:
+            return datetime.strptime(str_val, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+        except ValueError:
+            dt, msecs = str_val.split(".")
+            return datetime.strptime(dt, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+
+
+def parse_timestamp(str_val):
+    """Parse an ISO 8601 date string keeping its offset, dates without offset are UTC"""
+    value = datetime.fromisoformat(str_val.replace("Z", "+00:00"))
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
 class BaseDict(Mapping):
+    # Keys that can hold dates, subclasses with a known schema set this so other strings are never parsed.
+    # None means every string value is checked.
+    _datetime_keys = None
+
     def __init__(self, entries):
         self._storage = entries
+        self._parsed = {}
 
     def __getitem__(self, key):
-        if type(self._storage[key]) == str and validate_iso8601(self._storage[key]):
-            try:
-                return datetime.fromisoformat(self._storage[key]).replace(tzinfo=timezone.utc)
-            except ValueError:
-                try:
-                    return datetime.strptime(self._storage[key], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
-                except ValueError:
-                    dt, msecs = self._storage[key].split(".")
-                    return datetime.strptime(dt, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
-        return self._storage[key]
+        value = self._storage[key]
+        if type(value) is not str:
+            return value
+        # Parsed values are kept with the string they came from, in case the storage is changed directly
+        cached = self._parsed.get(key)
+        if cached is not None and cached[0] is value:
+            return cached[1]
+        if self._datetime_keys is not None and key not in self._datetime_keys:
+            return value
+        result = parse_iso8601(value) if validate_iso8601(value) else value
+        self._parsed[key] = (value, result)
+        return result
 
     def __setitem__(self, key, value):
         self._storage[key] = value
+        self._parsed.pop(key, None)
 
     def __iter__(self):
         return iter(self._storage)  # ``ghost`` is invisible
@@ -74,3 +177,98 @@ class BaseDict(Mapping):
 
     def get_data(self):
         return self._storage
+
+
+_NAN = float("nan")
+
+
+class CompactModel(Mapping):
+    """
+    Read only, memory compact alternative to BaseDict for payloads with a known set of fields.
+
+    Subclasses list their fields in _float_fields and _object_fields and set __slots__ = _object_fields.
+    Float fields are stored unboxed in one array (None as NaN, so ints read back as floats), other
+    fields in slots, and fields not in the schema in a dict. The payload dict is not copied. Like a dict
+    of the payload, only the fields in the payload are present, so dict(model) equals the payload.
+    Values are kept raw, dates in _datetime_keys are parsed when read.
+    """
+
+    __slots__ = ("_floats", "_extra", "_present")
+    _float_fields = ()
+    _object_fields = ()
+    _datetime_keys = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._float_index = {key: index for index, key in enumerate(cls._float_fields)}
+        cls._object_keys = frozenset(cls._object_fields)
+        # Bit of each known field in _present
+        cls._bits = {key: 1 << index for index, key in enumerate(cls._float_fields + cls._object_fields)}
+
+    def __init__(self, entries):
+        extra = None
+        present = 0
+        bits = self._bits
+        floats = array("d")
+        for key in self._float_fields:
+            value = entries.get(key)
+            if value is None:
+                floats.append(_NAN)
+            elif type(value) is float or type(value) is int:
+                floats.append(value)
+            else:
+                floats.append(_NAN)
+                extra = extra or {}
+                extra[key] = value
+        for key in self._object_fields:
+            setattr(self, key, entries.get(key))
+        for key, value in entries.items():
+            bit = bits.get(key)
+            if bit is None:
+                extra = extra or {}
+                extra[key] = value
+            else:
+                present |= bit
+        self._floats = floats
+        self._extra = extra
+        self._present = present
+
+    def __getitem__(self, key):
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        if not self._present & self._bits.get(key, 0):
+            raise KeyError(key)
+        index = self._float_index.get(key)
+        if index is not None:
+            value = self._floats[index]
+            return None if value != value else value
+        if key in self._object_keys:
+            value = getattr(self, key)
+            if key in self._datetime_keys and type(value) is str and validate_iso8601(value):
+                return parse_iso8601(value)
+            return value
+        raise KeyError(key)
+
+    def __iter__(self):
+        present = self._present
+        for key, bit in self._bits.items():
+            if present & bit:
+                yield key
+        if self._extra is not None:
+            for key in self._extra:
+                if key not in self._bits:
+                    yield key
+
+    def __len__(self):
+        extra = 0 if self._extra is None else sum(1 for key in self._extra if key not in self._bits)
+        return self._present.bit_count() + extra
+
+    def get_data(self):
+        """The raw values as a new dict"""
+        data = {}
+        for key in self:
+            if key in self._datetime_keys and key in self._object_keys:
+                data[key] = getattr(self, key)
+            else:
+                data[key] = self[key]
+        return data
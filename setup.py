@@ -22,5 +22,6 @@ setup(
     packages=["pyeasee"],
     include_package_data=True,
     install_requires=["aiohttp", "pysignalr==1.3.0"],
+    extras_require={"series": ["numpy"], "arrow": ["numpy", "pyarrow"]},
     entry_points={"console_scripts": ["pyeasee=pyeasee.__main__:main"]},
 )
@@ -25,3 +25,20 @@ def test_iso_datestring_defaults_to_utc():
     bd = BaseDict({"date": "2020-07-18T07:02:45Z"})
     date = bd.get("date")
     assert date.tzname() == "UTC"
+
+
+def test_parsed_date_is_cached_until_set():
+    bd = BaseDict({"date": "2020-07-18T07:02:45Z"})
+    assert bd["date"] is bd["date"]
+
+    bd["date"] = "2021-01-01T00:00:00Z"
+    assert bd["date"].year == 2021
+
+
+def test_datetime_keys_limit_parsing():
+    class Schema(BaseDict):
+        _datetime_keys = frozenset(["date"])
+
+    bd = Schema({"date": "2020-07-18T07:02:45Z", "name": "2020-07-18T07:02:45Z"})
+    assert type(bd["date"]) == datetime.datetime
+    assert bd["name"] == "2020-07-18T07:02:45Z"
@@ -1,5 +1,5 @@
 import pytest
-from pyeasee import Charger
+from pyeasee import Charger, CompactChargerConfig, CompactChargerState
 
 
 class MockResponse:
@@ -113,3 +113,34 @@ async def test_get_correct_phase_mode():
     charger = Charger({"id": "EH123456", "name": "Easee Home 12345", "productCode": 1, "userRole": 1, "levelOfAccess": 1}, mock_easee)
     state = await charger.get_config()
     assert state["phaseMode"] == "Locked to three phase"
+
+
+def test_compact_state_matches_payload():
+    state = CompactChargerState(default_state)
+    assert dict(state.get_data()) == default_state
+    assert len(state) == len(default_state)
+    assert state["voltage"] == default_state["voltage"]
+    assert state["circuitTotalAllocatedPhaseConductorCurrentL1"] is None
+    assert state["latestPulse"].tzname() == "UTC"
+    assert not hasattr(state, "__dict__")
+
+
+def test_compact_config_keeps_unknown_fields():
+    config = CompactChargerConfig({**default_config, "newField": "value"})
+    assert config["newField"] == "value"
+    assert config["maxChargerCurrent"] == 32.0
+    assert len(config) == len(default_config) + 1
+
+
+@pytest.mark.asyncio
+async def test_compact_state_from_charger():
+    payload = {"chargerOpMode": 3, "totalPower": 7.2, "newField": "value"}
+    charger = Charger({"id": "EH123456", "name": "Easee Home 12345", "productCode": 1, "levelOfAccess": 1}, MockEasee(get_data=payload))
+    state = await charger.get_compact_state()
+    assert isinstance(state, CompactChargerState)
+    # Only the fields in the payload, not every known field
+    assert dict(state) == payload
+    assert "voltage" not in state
+    assert state.get("voltage") is None
+    with pytest.raises(KeyError):
+        state["voltage"]
@@ -1,12 +1,30 @@
 import asyncio
+import datetime
 import json
 import os
+import re
+import sqlite3
 
 import aiohttp
 import pytest
 import pytest_asyncio
 from aioresponses import aioresponses
-from pyeasee import Charger, Easee
+from yarl import URL
+from pyeasee import (
+    DEFAULT_RETRY_POLICY,
+    CachePolicy,
+    Charger,
+    Easee,
+    FileTokenStore,
+    HistoryStore,
+    ResponseCache,
+    RetryPolicy,
+    Site,
+    export_sessions,
+)
+from pyeasee.easee import DEFAULT_TIMEOUT, TOKEN_MIN_REFRESH_DELAY
+from pyeasee.response import BufferedResponse
+from pyeasee.exceptions import ServerFailureException, TooManyRequestsException
 
 BASE_URL = "https://api.easee.com"
 
@@ -27,6 +45,51 @@ async def aiosession():
     return aiohttp.ClientSession()
 
 
+@pytest.mark.asyncio
+async def test_own_session_connection_options(monkeypatch):
+    connector_kwargs = {}
+    tcp_connector = aiohttp.TCPConnector
+
+    def connector(**kwargs):
+        connector_kwargs.update(kwargs)
+        return tcp_connector(**kwargs)
+
+    monkeypatch.setattr(aiohttp, "TCPConnector", connector)
+    easee = Easee("+46070123456", "password", connection_limit=20, connection_limit_per_host=5, dns_cache_ttl=60)
+
+    assert connector_kwargs["limit"] == 20
+    assert connector_kwargs["limit_per_host"] == 5
+    assert connector_kwargs["use_dns_cache"] is True
+    assert connector_kwargs["ttl_dns_cache"] == 60
+    assert easee.session.timeout == DEFAULT_TIMEOUT
+    assert easee.get_pool_stats() == {"limit": 20, "limit_per_host": 5, "in_use": 0, "idle": 0}
+
+    await easee.close()
+
+
+@pytest.mark.asyncio
+async def test_external_session_timeout_per_request(aiosession, aioresponse):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+    aioresponse.get(f"{BASE_URL}/api/chargers", payload=[])
+
+    timeout = aiohttp.ClientTimeout(total=5)
+    easee = Easee("+46070123456", "password", aiosession, timeout=timeout)
+    await easee.get_chargers()
+
+    # The session is not changed, the timeout goes with each request
+    assert aiosession.timeout != timeout
+    requests = aioresponse.requests[("GET", URL(f"{BASE_URL}/api/chargers"))]
+    assert requests[0].kwargs["timeout"] == timeout
+    # Also for the login, a hanging auth endpoint does not block forever
+    logins = aioresponse.requests[("POST", URL(f"{BASE_URL}/api/accounts/login"))]
+    assert logins[0].kwargs["timeout"] == timeout
+
+    await easee.close()
+    await aiosession.close()
+
+
 @pytest.mark.asyncio
 async def test_get_chargers(aiosession, aioresponse):
 
@@ -104,5 +167,588 @@ async def test_get_site_state(aiosession, aioresponse):
     charger_state = site_state.get_charger_state("NOTEXIST")
     assert charger_state is None
 
+    assert site_state.get_charger_state("EH123497") is site_state.get_charger_state("EH123497")
+    assert site_state.get_circuit_state(12345)["chargerStates"][0]["chargerID"] == "EH123497"
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_login(aiosession, aioresponse):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data, repeat=True)
+
+    chargers_data = load_json_fixture("chargers.json")
+    aioresponse.get(f"{BASE_URL}/api/chargers", payload=chargers_data, repeat=True)
+
+    easee = Easee("+46070123456", "password", aiosession)
+    results = await asyncio.gather(*[easee.get_chargers() for _ in range(10)])
+    assert all(chargers[0].id == "EH12345" for chargers in results)
+
+    logins = [key for key in aioresponse.requests if key[0] == "POST" and str(key[1]).endswith("/login")]
+    assert len(aioresponse.requests[logins[0]]) == 1
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_token_refresher_short_lived_token(aiosession, monkeypatch):
+    easee = Easee("+46070123456", "password", aiosession)
+    refreshes = []
+    delays = []
+
+    async def refresh_token():
+        refreshes.append(True)
+        # Shorter lived than the refresh margin
+        easee.token = {"accessToken": "token", "expires": datetime.datetime.now() + datetime.timedelta(seconds=20)}
+
+    async def sleep(delay):
+        delays.append(delay)
+        if len(delays) == 3:
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(easee, "_refresh_token", refresh_token)
+    await refresh_token()
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    with pytest.raises(asyncio.CancelledError):
+        await easee._token_refresh_loop()
+    monkeypatch.undo()
+
+    # The refresher waits between refreshes instead of looping against the auth endpoint
+    assert all(delay >= TOKEN_MIN_REFRESH_DELAY for delay in delays)
+    assert len(refreshes) == 3
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_token_store_skips_login(aiosession, aioresponse, tmp_path):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+
+    chargers_data = load_json_fixture("chargers.json")
+    aioresponse.get(f"{BASE_URL}/api/chargers", payload=chargers_data, repeat=True)
+
+    token_store = FileTokenStore(tmp_path / "token.json")
+    easee = Easee("+46070123456", "password", aiosession, token_store=token_store)
+    await easee.get_chargers()
+    await easee.close()
+    assert token_store.load()["token"]["accessToken"] == "sometoken1234"
+
+    # The login is only mocked once, a second login would fail the request
+    easee = Easee("+46070123456", "password", aiosession, token_store=token_store)
+    chargers = await easee.get_chargers()
+    assert chargers[0].id == "EH12345"
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_throttlers_shared_between_objects(aiosession):
+    easee = Easee("+46070123456", "password", aiosession)
+
+    first = easee.get_throttler("sessions between dates", "EH12345", rate_limit=10, period=3600)
+    second = easee.get_throttler("sessions between dates", "EH12345", rate_limit=10, period=3600)
+    other = easee.get_throttler("sessions between dates", "EH54321", rate_limit=10, period=3600)
+
+    assert first is second
+    assert first is not other
+    assert first.parent is easee._general_throttler
+
+    throttlers = []
+
+    async def get(url, throttler=None, **kwargs):
+        throttlers.append(throttler)
+        return BufferedResponse(200, {}, url, b"[]")
+
+    easee.get = get
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    end = datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc)
+    # Objects for the same product made at different times, e.g. from get_chargers and a site, share limits
+    for _ in range(2):
+        charger = Charger({"id": "EH12345", "name": "Easee Home 12345", "productCode": 1, "levelOfAccess": 1}, easee)
+        await charger.get_sessions_between_dates(start, end)
+    for _ in range(2):
+        site = Site({"id": 54321, "name": "Site", "circuits": []}, easee)
+        await site.get_cost_between_dates(start, end)
+
+    assert throttlers[0] is throttlers[1] is first
+    assert throttlers[2] is throttlers[3]
+    assert throttlers[2] is not first
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_retry_server_failure(aiosession, aioresponse):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+
+    chargers_data = load_json_fixture("chargers.json")
+    aioresponse.get(f"{BASE_URL}/api/chargers", status=503)
+    aioresponse.get(f"{BASE_URL}/api/chargers", status=429, headers={"Retry-After": "0"})
+    aioresponse.get(f"{BASE_URL}/api/chargers", payload=chargers_data)
+
+    easee = Easee("+46070123456", "password", aiosession, retry_policy=RetryPolicy(base_delay=0))
+    chargers = await easee.get_chargers()
+    assert chargers[0].id == "EH12345"
+
+    # Commands are not idempotent and are not retried on server failures
+    aioresponse.post(f"{BASE_URL}/api/chargers/EH12345/commands/start_charging", status=503)
+    aioresponse.post(f"{BASE_URL}/api/chargers/EH12345/commands/start_charging", status=200)
+    assert await chargers[0].start() is None
+
+    await easee.close()
+    await aiosession.close()
+
+
+def test_default_retry_policy_is_conservative():
+    policy = DEFAULT_RETRY_POLICY
+    rate_limited = TooManyRequestsException("Too many requests", "5")
+
+    assert policy.get_delay("GET", 1, rate_limited) == 5
+    # Commands are sent once, also when rate limited
+    assert policy.get_delay("POST", 1, rate_limited) is None
+    # A long Retry-After gives up instead of blocking the caller
+    assert policy.get_delay("GET", 1, TooManyRequestsException("Too many requests", "120")) is None
+    assert policy.get_delay("GET", policy.max_attempts, ServerFailureException("Server failure")) is None
+
+
+@pytest.mark.asyncio
+async def test_coalesce_identical_gets(aiosession, aioresponse):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+
+    chargers_state_data = load_json_fixture("charger-state.json")
+    aioresponse.get(f"{BASE_URL}/api/chargers/EH12345/state", payload=chargers_state_data)
+
+    easee = Easee("+46070123456", "password", aiosession)
+    charger = Charger({"id": "EH12345", "name": "Easee Home 12345", "productCode": 1, "levelOfAccess": 1}, easee)
+
+    # The state is only mocked once, every caller must share the same request
+    states = await asyncio.gather(*[charger.get_state(raw=True) for _ in range(5)])
+    assert all(state["chargerOpMode"] == 2 for state in states)
+    assert easee.get_coalescing_stats() == {"hits": 4, "misses": 1}
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_config_cache_invalidated_by_settings(aiosession, aioresponse):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+
+    config = {"phaseMode": 2, "localNodeType": 1, "smartButtonEnabled": False}
+    aioresponse.get(f"{BASE_URL}/api/chargers/EH12345/config", payload=config)
+
+    easee = Easee("+46070123456", "password", aiosession, response_cache=ResponseCache())
+    charger = Charger({"id": "EH12345", "name": "Easee Home 12345", "productCode": 1, "levelOfAccess": 1}, easee)
+
+    assert (await charger.get_config(raw=True))["smartButtonEnabled"] is False
+    # Only mocked once, so this must come from the cache
+    assert (await charger.get_config(from_cache=True, raw=True))["smartButtonEnabled"] is False
+
+    aioresponse.post(f"{BASE_URL}/api/chargers/EH12345/settings", status=200)
+    await charger.smartButtonEnabled(True)
+
+    aioresponse.get(f"{BASE_URL}/api/chargers/EH12345/config", payload={**config, "smartButtonEnabled": True})
+    assert (await charger.get_config(from_cache=True, raw=True))["smartButtonEnabled"] is True
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_cache_is_opt_in(aiosession, aioresponse):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+
+    site_url = f"{BASE_URL}/api/sites/1?detailed=true"
+    aioresponse.get(site_url, payload={"id": 1, "name": "First", "circuits": [{"id": 2, "chargers": []}]})
+    aioresponse.get(site_url, payload={"id": 1, "name": "Second", "circuits": []})
+    aioresponse.get(site_url, payload={"id": 1, "name": "Third", "circuits": [{"id": 2, "chargers": []}]})
+
+    easee = Easee("+46070123456", "password", aiosession)
+    assert (await easee.get_site(1))["name"] == "First"
+    assert (await easee.get_site(1))["name"] == "Second"
+    await easee.close()
+
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+    easee = Easee("+46070123456", "password", aiosession, response_cache=ResponseCache())
+    site = await easee.get_site(1)
+    site["circuits"][0]["chargers"].append({"id": "EH12345"})
+    # Served from the cache, changes to the previous site did not leak into it
+    again = await easee.get_site(1)
+    assert again["name"] == "Third"
+    assert again["circuits"][0]["chargers"] == []
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_charge_plan_change_does_not_touch_cached_plan(aiosession, aioresponse):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+
+    plan = {"isEnabled": True, "days": [{"dayOfWeek": 0, "ranges": []}]}
+    aioresponse.get(f"{BASE_URL}/api/chargers/EH12345/weekly_charge_plan", payload=plan)
+    aioresponse.post(f"{BASE_URL}/api/chargers/EH12345/weekly_charge_plan", status=200)
+
+    cache = ResponseCache([CachePolicy(r"/weekly_charge_plan$", ttl=60)])
+    easee = Easee("+46070123456", "password", aiosession, response_cache=cache)
+    charger = Charger({"id": "EH12345", "name": "Easee Home 12345", "productCode": 1, "levelOfAccess": 1}, easee)
+
+    cached = await (await easee.get("/api/chargers/EH12345/weekly_charge_plan")).json()
+    # Served from the cache, the change is made on a copy
+    await charger.disable_weekly_charge_plan()
+    posted = aioresponse.requests[("POST", URL(f"{BASE_URL}/api/chargers/EH12345/weekly_charge_plan"))]
+    assert json.loads(posted[0].kwargs["data"])["isEnabled"] is False
+    assert cached == plan
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_site_state_conditional_request(aiosession, aioresponse):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+
+    site_state_data = load_json_fixture("site-state.json")
+    aioresponse.get(f"{BASE_URL}/api/sites/54321/state", payload=site_state_data, headers={"ETag": '"v1"'})
+    aioresponse.get(f"{BASE_URL}/api/sites/54321/state", status=304)
+
+    easee = Easee("+46070123456", "password", aiosession, response_cache=ResponseCache())
+    first = await (await easee.get("/api/sites/54321/state")).json()
+    second = await (await easee.get("/api/sites/54321/state")).json()
+
+    # The 304 returns the already decoded payload
+    assert second is first
+    requests = aioresponse.requests[("GET", URL(f"{BASE_URL}/api/sites/54321/state"))]
+    assert requests[1].kwargs["headers"]["If-None-Match"] == '"v1"'
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_conditional_request_without_cache(aiosession, aioresponse):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+
+    chargers_data = load_json_fixture("chargers.json")
+    aioresponse.get(f"{BASE_URL}/api/chargers", payload=chargers_data, headers={"ETag": '"v1"'})
+    aioresponse.get(f"{BASE_URL}/api/chargers", status=304)
+
+    easee = Easee("+46070123456", "password", aiosession)
+    assert easee.response_cache is None
+    first = await easee.get_chargers()
+    second = await easee.get_chargers()
+
+    assert [charger.id for charger in second] == [charger.id for charger in first]
+    requests = aioresponse.requests[("GET", URL(f"{BASE_URL}/api/chargers"))]
+    assert "If-None-Match" not in requests[0].kwargs["headers"]
+    assert requests[1].kwargs["headers"]["If-None-Match"] == '"v1"'
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_refresh_chargers_from_site_state(aiosession, aioresponse):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+
+    site_state_data = load_json_fixture("site-state.json")
+    aioresponse.get(f"{BASE_URL}/api/sites/54321/state", payload=site_state_data)
+
+    easee = Easee("+46070123456", "password", aiosession)
+    circuits = [circuit_state["circuit"] for circuit_state in site_state_data["circuitStates"]]
+    site = Site({"id": 54321, "name": "Site", "circuits": circuits}, easee)
+
+    chargers = await site.refresh_chargers()
+
+    assert chargers[0].id == "EH123497"
+    assert chargers[0].state["chargerOpMode"] == "DISCONNECTED"
+    assert chargers[0].config["localNodeType"] == "Master"
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_buffered_response_takes_aiohttp_arguments(aiosession, aioresponse):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+    aioresponse.get(f"{BASE_URL}/api/chargers", payload=[{"id": "EH12345"}])
+
+    easee = Easee("+46070123456", "password", aiosession)
+    response = await easee.get("/api/chargers")
+
+    shared = await response.json(content_type=None)
+    assert shared is await response.json()
+    # A caller's own loads gets text like from aiohttp and a copy of its own
+    own = await response.json(loads=lambda text: json.loads(text.upper()))
+    assert own == [{"ID": "EH12345"}]
+    assert shared == [{"id": "EH12345"}]
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_custom_json_codec(aiosession, aioresponse):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+
+    chargers_data = load_json_fixture("chargers.json")
+    aioresponse.get(f"{BASE_URL}/api/chargers", payload=chargers_data)
+    aioresponse.post(f"{BASE_URL}/api/chargers/EH12345/settings", status=200)
+    aioresponse.post(f"{BASE_URL}/local-ocpp/v1/connection-details/EH12345", payload={"version": 3})
+
+    decoded = []
+    encoded = []
+
+    def loads(data):
+        decoded.append(data)
+        return json.loads(data)
+
+    def dumps(data):
+        encoded.append(data)
+        return json.dumps(data)
+
+    easee = Easee("+46070123456", "password", aiosession, json_loads=loads, json_dumps=dumps)
+    chargers = await easee.get_chargers()
+    await chargers[0].smartButtonEnabled(True)
+    assert await chargers[0].set_ocpp_config(True, "wss://ocpp.example.com") == 3
+
+    # Token, chargers and the OCPP response decoded, login, settings and OCPP config encoded
+    assert len(decoded) == 3
+    assert encoded[1] == {"smartButtonEnabled": True}
+
+    await easee.close()
+    await aiosession.close()
+
+
+class HourlyCharger:
+    def __init__(self, id):
+        self.id = id
+
+    async def get_hourly_consumption_between_dates(self, from_date, to_date):
+        hours = []
+        hour = from_date
+        while hour <= to_date:
+            hours.append({"from": hour.isoformat(), "totalEnergy": 1.0})
+            hour += datetime.timedelta(hours=12)
+        return hours
+
+
+@pytest.mark.asyncio
+async def test_iter_hourly_consumption_is_ordered(aiosession):
+    easee = Easee("+46070123456", "password", aiosession)
+    chargers = [HourlyCharger("EH1"), HourlyCharger("EH2")]
+    start = datetime.datetime(2025, 1, 20, tzinfo=datetime.timezone.utc)
+    end = datetime.datetime(2025, 3, 10, tzinfo=datetime.timezone.utc)
+
+    records = [
+        (charger.id, record["from"]) async for charger, record in easee.iter_hourly_consumption(chargers, start, end)
+    ]
+
+    # Two records a day per charger, none repeated on the window edges
+    assert len(records) == 2 * 2 * (end - start).days
+    assert records == sorted(records, key=lambda r: (r[1], r[0]))
+
+    await easee.close()
+    await aiosession.close()
+
+
+class FailingHourlyCharger(HourlyCharger):
+    async def get_hourly_consumption_between_dates(self, from_date, to_date):
+        if from_date.month == 2:
+            return None
+        return await super().get_hourly_consumption_between_dates(from_date, to_date)
+
+
+@pytest.mark.asyncio
+async def test_iter_hourly_consumption_failed_window(aiosession):
+    # One request at a time, so January is complete before February fails
+    easee = Easee("+46070123456", "password", aiosession, max_parallel_requests=1)
+    chargers = [HourlyCharger("EH1"), FailingHourlyCharger("EH2")]
+    start = datetime.datetime(2025, 1, 20, tzinfo=datetime.timezone.utc)
+    end = datetime.datetime(2025, 3, 10, tzinfo=datetime.timezone.utc)
+
+    records = []
+    with pytest.raises(ServerFailureException):
+        async for charger, record in easee.iter_hourly_consumption(chargers, start, end):
+            records.append(record["from"])
+
+    # January is yielded, nothing after the failed February window
+    assert records and all(record.startswith("2025-01") for record in records)
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_history_store_fetches_only_missing_hours(aiosession, aioresponse):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+
+    def hours(start, count):
+        return [
+            {"from": f"2024-01-01T{h:02d}:00:00+00:00", "to": f"2024-01-01T{h + 1:02d}:00:00+00:00", "totalEnergy": 1.5}
+            for h in range(start, start + count)
+        ]
+
+    hourly_url = re.compile(rf"^{BASE_URL}/api/chargers/EH12345/usage/hourly/.*$")
+    aioresponse.get(hourly_url, payload=hours(0, 3))
+    aioresponse.get(hourly_url, payload=hours(3, 2))
+
+    history = HistoryStore(":memory:")
+    easee = Easee("+46070123456", "password", aiosession, history_store=history)
+    charger = Charger({"id": "EH12345", "name": "Easee Home 12345", "productCode": 1, "levelOfAccess": 1}, easee)
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+    first = await charger.get_hourly_consumption_between_dates(start, start + datetime.timedelta(hours=3))
+    # Served from the store, nothing is mocked for a repeated request
+    again = await charger.get_hourly_consumption_between_dates(start, start + datetime.timedelta(hours=3))
+    assert first == again == hours(0, 3)
+
+    # Only the hours after the stored window are fetched
+    longer = await charger.get_hourly_consumption_between_dates(start, start + datetime.timedelta(hours=5))
+    assert longer == hours(0, 5)
+    hourly_requests = [url for method, url in aioresponse.requests if "usage/hourly" in url.path]
+    assert len(hourly_requests) == 2
+    assert "2024-01-01T03:00:00+00:00" in hourly_requests[1].path
+
+    # The store is closed with the client
+    await easee.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        await history.missing("hourly_usage", "EH12345", start.timestamp(), start.timestamp() + 3600)
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_history_store_splits_long_ranges(aiosession, aioresponse):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+
+    def hour(month):
+        return {
+            "from": f"2024-{month:02d}-10T00:00:00+00:00",
+            "to": f"2024-{month:02d}-10T01:00:00+00:00",
+            "totalEnergy": 1.0,
+        }
+
+    hourly_url = re.compile(rf"^{BASE_URL}/api/chargers/EH12345/usage/hourly/.*$")
+    for month in (1, 2, 3):
+        aioresponse.get(hourly_url, payload=[hour(month)])
+
+    history = HistoryStore(":memory:")
+    easee = Easee("+46070123456", "password", aiosession, history_store=history)
+    charger = Charger({"id": "EH12345", "name": "Easee Home 12345", "productCode": 1, "levelOfAccess": 1}, easee)
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    end = datetime.datetime(2024, 4, 1, tzinfo=datetime.timezone.utc)
+
+    records = await charger.get_hourly_consumption_between_dates(start, end)
+    assert records == [hour(1), hour(2), hour(3)]
+    # One request per calendar month, each marked complete on its own
+    hourly_requests = [url for method, url in aioresponse.requests if "usage/hourly" in url.path]
+    assert len(hourly_requests) == 3
+    assert await history.missing("hourly_usage", "EH12345", start.timestamp(), end.timestamp()) == []
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_export_sessions_resumes(aiosession, aioresponse, tmp_path):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+
+    def session(day, month):
+        return {
+            "carConnected": f"2024-{month:02d}-{day:02d}T10:00:00Z",
+            "carDisconnected": f"2024-{month:02d}-{day:02d}T12:00:00Z",
+            "kiloWattHours": 5.0,
+        }
+
+    sessions_url = re.compile(rf"^{BASE_URL}/api/sessions/charger/EH12345/sessions/.*$")
+    # Newest first like the API, the session starting on the window edge belongs to the next month
+    aioresponse.get(sessions_url, payload=[session(1, 2), session(20, 1), session(3, 1)])
+    aioresponse.get(sessions_url, status=500)
+    aioresponse.get(sessions_url, payload=[session(9, 2), session(1, 2)])
+    aioresponse.get(sessions_url, payload=[session(5, 3)])
+
+    easee = Easee("+46070123456", "password", aiosession, retry_policy=RetryPolicy(max_attempts=1))
+    charger = Charger({"id": "EH12345", "name": "Easee Home 12345", "productCode": 1, "levelOfAccess": 1}, easee)
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    end = datetime.datetime(2024, 4, 1, tzinfo=datetime.timezone.utc)
+    path = str(tmp_path / "sessions.ndjson")
+
+    with pytest.raises(ServerFailureException):
+        await export_sessions(charger, start, end, path)
+    assert os.path.exists(f"{path}.checkpoint")
+
+    assert await export_sessions(charger, start, end, path) == 3
+    assert not os.path.exists(f"{path}.checkpoint")
+    with open(path) as exported:
+        started = [json.loads(line)["carConnected"] for line in exported]
+    assert started == [
+        "2024-01-03T10:00:00Z",
+        "2024-01-20T10:00:00Z",
+        "2024-02-01T10:00:00Z",
+        "2024-02-09T10:00:00Z",
+        "2024-03-05T10:00:00Z",
+    ]
+
+    await easee.close()
+    await aiosession.close()
+
+
+@pytest.mark.asyncio
+async def test_export_sessions_window(aiosession, aioresponse, tmp_path):
+
+    token_data = load_json_fixture("token.json")
+    aioresponse.post(f"{BASE_URL}/api/accounts/login", payload=token_data)
+
+    sessions_url = re.compile(rf"^{BASE_URL}/api/sessions/charger/EH12345/sessions/.*$")
+    aioresponse.get(sessions_url, payload=[{"carConnected": "2024-01-05T10:00:00Z", "kiloWattHours": 5.0}])
+    aioresponse.get(sessions_url, payload=[{"carConnected": "2024-01-20T10:00:00Z", "kiloWattHours": 3.0}])
+
+    easee = Easee("+46070123456", "password", aiosession)
+    charger = Charger({"id": "EH12345", "name": "Easee Home 12345", "productCode": 1, "levelOfAccess": 1}, easee)
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    end = datetime.datetime(2024, 1, 31, tzinfo=datetime.timezone.utc)
+    path = str(tmp_path / "sessions.csv")
+
+    # Two 15 day windows, one request each
+    assert await export_sessions(charger, start, end, path, format="csv", window=datetime.timedelta(days=15)) == 2
+    session_requests = [url for method, url in aioresponse.requests if "/sessions/" in url.path]
+    assert len(session_requests) == 2
+    assert "2024-01-16T00:00:00+00:00" in session_requests[1].path
+
     await easee.close()
     await aiosession.close()
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from pyeasee import Easee, HourlySeries  # noqa: E402
+import pyeasee.series  # noqa: E402
+
+
+def hourly_records(start, energies):
+    return [
+        {
+            "from": (start + timedelta(hours=hour)).isoformat(),
+            "to": (start + timedelta(hours=hour + 1)).isoformat(),
+            "totalEnergy": energy,
+        }
+        for hour, energy in enumerate(energies)
+    ]
+
+
+def epoch(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+def test_from_records():
+    start = datetime(2025, 1, 31, 22, tzinfo=timezone.utc)
+    series = HourlySeries.from_records(hourly_records(start, [1.0, None, 2.5]), "EH1")
+
+    assert series.timestamps.dtype == np.int64
+    assert series.energy.dtype == np.float64
+    assert list(series.timestamps) == [epoch(2025, 1, 31, 22), epoch(2025, 1, 31, 23), epoch(2025, 2, 1, 0)]
+    assert series.total() == 3.5
+    assert series.products == ["EH1"]
+
+
+def test_sum_resample_and_peaks():
+    start = datetime(2025, 1, 31, 22, tzinfo=timezone.utc)
+    series = HourlySeries.concat(
+        [
+            HourlySeries.from_records(hourly_records(start, [1.0, 2.0, 3.0]), "EH1"),
+            HourlySeries.from_records(hourly_records(start, [0.5, 0.5, 4.0]), "EH2"),
+        ]
+    )
+    assert series.products == ["EH1", "EH2"]
+    assert list(series.for_product("EH2").energy) == [0.5, 0.5, 4.0]
+
+    site = series.sum_by_timestamp()
+    assert list(site.energy) == [1.5, 2.5, 7.0]
+    assert site.product_codes is None
+
+    daily = series.resample("day")
+    assert [(series.products[c], t, e) for c, t, e in zip(daily.product_codes, daily.timestamps, daily.energy)] == [
+        ("EH1", epoch(2025, 1, 31), 3.0),
+        ("EH1", epoch(2025, 2, 1), 3.0),
+        ("EH2", epoch(2025, 1, 31), 1.0),
+        ("EH2", epoch(2025, 2, 1), 4.0),
+    ]
+    # In UTC+2 all three hours are on February 1st
+    assert list(site.resample("day", utc_offset=7200).timestamps) == [epoch(2025, 1, 31, 22)]
+    assert list(site.resample("week").timestamps) == [epoch(2025, 1, 27)]
+    monthly = site.resample("month")
+    assert list(monthly.timestamps) == [epoch(2025, 1, 1), epoch(2025, 2, 1)]
+    assert list(monthly.energy) == [4.0, 7.0]
+
+    peaks = series.peaks(2)
+    assert list(peaks.energy) == [4.0, 3.0]
+    assert [series.products[c] for c in peaks.product_codes] == ["EH2", "EH1"]
+
+    with pytest.raises(ValueError):
+        series.resample("year")
+
+
+def test_to_arrow():
+    pytest.importorskip("pyarrow")
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    table = HourlySeries.from_records(hourly_records(start, [1.0, 2.0]), "EH1").to_arrow()
+
+    assert table.column_names == ["timestamp", "totalEnergy", "productId"]
+    assert table.column("totalEnergy").to_pylist() == [1.0, 2.0]
+    assert table.column("productId").to_pylist() == ["EH1", "EH1"]
+
+
+@pytest.mark.asyncio
+async def test_without_numpy(monkeypatch):
+    monkeypatch.setattr(pyeasee.series, "np", None)
+    with pytest.raises(ImportError):
+        HourlySeries.from_records(hourly_records(datetime(2024, 1, 1, tzinfo=timezone.utc), [1.0]), "EH1")
+
+    class Charger:
+        id = "EH1"
+
+        async def get_hourly_consumption_between_dates(self, from_date, to_date):
+            raise AssertionError("Nothing is fetched without numpy")
+
+    easee = Easee("+46070123456", "password")
+    with pytest.raises(ImportError):
+        await easee.get_hourly_series([Charger()], datetime(2024, 1, 1), datetime(2024, 3, 1))
+    await easee.close()
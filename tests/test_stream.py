@@ -0,0 +1,398 @@
+import asyncio
+
+import aiohttp
+import pytest
+import pytest_asyncio
+from pyeasee import (
+    Charger,
+    ChargerStreamData,
+    DatatypesStreamData,
+    Easee,
+    HashRing,
+    StreamDispatcher,
+    StreamMirror,
+)
+
+
+@pytest_asyncio.fixture
+async def easee(monkeypatch):
+    session = aiohttp.ClientSession()
+    easee = Easee("+46070123456", "password", session)
+
+    async def no_connect(*args, **kwargs):
+        pass
+
+    # Subscriptions are registered without opening a SignalR connection
+    monkeypatch.setattr(easee, "_sr_connect", no_connect)
+    yield easee
+    await easee.close()
+    await session.close()
+
+
+def update(product_id, data_id, data_type, value):
+    return {"mid": product_id, "dataType": data_type, "id": data_id, "value": value}
+
+
+def test_mirror():
+    mirror = StreamMirror()
+    mirror.update("EH12345", ChargerStreamData.state_totalPower.value, 7.2)
+    mirror.update("QP12345", 30, 1.5)
+
+    assert mirror.get("EH12345", ChargerStreamData.state_totalPower) == 7.2
+    assert mirror.get("EH12345", ChargerStreamData.state_outputCurrent) is None
+    assert mirror.snapshot("EH12345") == {"state_totalPower": 7.2}
+    assert "QP12345" in mirror
+    assert mirror.last_update("EH12345") == mirror.last_update("EH12345", ChargerStreamData.state_totalPower)
+
+    mirror.clear("EH12345")
+    assert mirror.snapshot("EH12345") == {}
+    assert mirror.last_update("EH12345") is None
+
+
+@pytest.mark.asyncio
+async def test_stream_state_follows_updates(easee):
+    charger = Charger({"id": "EH12345", "name": "Easee Home 12345", "productCode": 1, "levelOfAccess": 1}, easee)
+    received = []
+
+    async def callback(product_id, data_type, data_id, value):
+        # The mirror follows the stream, callbacks see it already holding the latest values
+        received.append((data_id, value, charger.get_stream_state()[ChargerStreamData(data_id).name]))
+
+    await easee.sr_subscribe(charger, callback)
+    await easee._sr_product_update_cb(
+        [
+            update("EH12345", ChargerStreamData.state_totalPower.value, 3, "7.2"),
+            update("EH12345", ChargerStreamData.state_chargerOpMode.value, 4, "3"),
+            update("EH12345", ChargerStreamData.state_totalPower.value, 3, "7.4"),
+        ]
+    )
+    await easee._sr_dispatcher.join()
+
+    assert charger.get_stream_state() == {"state_totalPower": 7.4, "state_chargerOpMode": 3}
+    assert [value for _, value, _ in received] == [7.2, 3, 7.4]
+    assert [mirrored for _, _, mirrored in received] == [7.4, 3, 7.4]
+    assert easee.sr_state.last_update("EH12345", ChargerStreamData.state_chargerOpMode) is not None
+
+
+@pytest.mark.asyncio
+async def test_mirror_not_held_up_by_queue(monkeypatch):
+    session = aiohttp.ClientSession()
+    easee = Easee("+46070123456", "password", session, sr_max_queue=2, sr_overflow="drop_oldest")
+
+    async def no_connect(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(easee, "_sr_connect", no_connect)
+    charger = Charger({"id": "EH12345", "name": "Easee Home 12345", "productCode": 1, "levelOfAccess": 1}, easee)
+    release = asyncio.Event()
+
+    async def callback(product_id, data_type, data_id, value):
+        await release.wait()
+
+    await easee.sr_subscribe(charger, callback)
+    for value in range(10):
+        await easee._sr_product_update_cb([update("EH12345", ChargerStreamData.state_totalPower.value, 3, str(value))])
+        await asyncio.sleep(0)
+
+    # The callback is stuck and most updates were dropped from the queue, the mirror is current anyway
+    assert easee.get_stream_queue_stats()["EH12345"]["dropped"] > 0
+    assert charger.get_stream_state() == {"state_totalPower": 9.0}
+
+    release.set()
+    await easee._sr_dispatcher.join()
+    await easee.close()
+    await session.close()
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_slow_product_does_not_block_others():
+    delivered = []
+    slow_started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def handler(product_id, messages):
+        if product_id == "EH1":
+            slow_started.set()
+            await release.wait()
+        delivered.extend((product_id, m["value"]) for m in messages)
+
+    dispatcher = StreamDispatcher(handler)
+    await dispatcher.put("EH1", update("EH1", 120, 3, "1"))
+    await slow_started.wait()
+    for value in range(3):
+        await dispatcher.put("EH2", update("EH2", 120, 3, str(value)))
+    await dispatcher.put("EH1", update("EH1", 120, 3, "2"))
+
+    # EH2 is handled while EH1 is stuck, in order
+    await asyncio.sleep(0)
+    assert delivered == [("EH2", "0"), ("EH2", "1"), ("EH2", "2")]
+
+    release.set()
+    await dispatcher.join()
+    assert [value for product_id, value in delivered if product_id == "EH1"] == ["1", "2"]
+    assert dispatcher.get_queue_stats()["EH1"]["delivered"] == 2
+    await dispatcher.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "overflow, expected, dropped, coalesced",
+    [
+        ("drop_oldest", ["p2", "p3"], 2, 0),
+        ("coalesce", ["p3", "c1"], 0, 2),
+    ],
+)
+async def test_dispatcher_overflow(overflow, expected, dropped, coalesced):
+    delivered = []
+    release = asyncio.Event()
+
+    async def handler(product_id, messages):
+        await release.wait()
+        delivered.extend(m["value"] for m in messages)
+
+    dispatcher = StreamDispatcher(handler, max_queue=2, overflow=overflow)
+    await dispatcher.put("EH1", update("EH1", 120, 3, "first"))
+    # The worker holds the first update, the queue fills behind it
+    await asyncio.sleep(0)
+    for data_id, value in [(120, "p1"), (121, "c1"), (120, "p2"), (120, "p3")]:
+        await dispatcher.put("EH1", update("EH1", data_id, 3, value))
+
+    release.set()
+    await dispatcher.join()
+    assert delivered[0] == "first"
+    assert delivered[1:] == expected
+    stats = dispatcher.get_queue_stats()["EH1"]
+    assert (stats["dropped"], stats["coalesced"], stats["max_depth"]) == (dropped, coalesced, 2)
+    await dispatcher.close()
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_discard_releases_blocked_put():
+    release = asyncio.Event()
+
+    async def handler(product_id, messages):
+        await release.wait()
+
+    dispatcher = StreamDispatcher(handler, max_queue=1, overflow="block")
+    await dispatcher.put("EH1", update("EH1", 120, 3, "1"))
+    await asyncio.sleep(0)
+    await dispatcher.put("EH1", update("EH1", 120, 3, "2"))
+    blocked = asyncio.create_task(dispatcher.put("EH1", update("EH1", 120, 3, "3")))
+    await asyncio.sleep(0)
+    assert not blocked.done()
+
+    # Unsubscribing or closing while the stream reader waits for room must not hang it
+    await dispatcher.discard("EH1")
+    await asyncio.wait_for(blocked, 1)
+    assert dispatcher.get_queue_stats() == {}
+    await dispatcher.close()
+
+
+@pytest.mark.asyncio
+async def test_coalesced_batches(monkeypatch):
+    session = aiohttp.ClientSession()
+    easee = Easee("+46070123456", "password", session, sr_coalesce_window=0.05)
+
+    async def no_connect(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(easee, "_sr_connect", no_connect)
+    charger = Charger({"id": "EH12345", "name": "Easee Home 12345", "productCode": 1, "levelOfAccess": 1}, easee)
+    batches = []
+
+    async def callback(product_id, updates):
+        batches.append(updates)
+
+    await easee.sr_subscribe(charger, callback, batch=True)
+    # A burst of power and current updates arrives as one batch with the latest value of each
+    for value in range(10):
+        await easee._sr_product_update_cb(
+            [
+                update("EH12345", ChargerStreamData.state_totalPower.value, 3, str(value)),
+                update("EH12345", ChargerStreamData.state_outputCurrent.value, 3, str(value * 2)),
+            ]
+        )
+    await asyncio.sleep(0)
+    await easee._sr_dispatcher.join()
+
+    assert batches == [[(3, 120, 9.0), (3, 114, 18.0)]]
+    assert easee.get_stream_queue_stats()["EH12345"]["coalesced"] == 18
+    assert charger.get_stream_state()["state_totalPower"] == 9.0
+
+    await easee.close()
+    await session.close()
+
+
+@pytest.mark.asyncio
+async def test_many_filtered_subscribers(easee):
+    charger = Charger({"id": "EH12345", "name": "Easee Home 12345", "productCode": 1, "levelOfAccess": 1}, easee)
+    power = []
+    doubles = []
+    everything = []
+
+    async def on_power(product_id, data_type, data_id, value):
+        power.append(value)
+
+    async def on_double(product_id, data_type, data_id, value):
+        doubles.append(data_id)
+
+    async def on_everything(product_id, data_type, data_id, value):
+        everything.append(data_id)
+
+    power_subscription = await easee.sr_subscribe(charger, on_power, data_ids=[ChargerStreamData.state_totalPower])
+    await easee.sr_subscribe(charger, on_double, data_types=[DatatypesStreamData.Double])
+    all_subscription = await easee.sr_subscribe(charger, on_everything)
+
+    updates = [
+        update("EH12345", ChargerStreamData.state_totalPower.value, 3, "7.2"),
+        update("EH12345", ChargerStreamData.state_chargerOpMode.value, 4, "3"),
+        update("EH12345", ChargerStreamData.state_outputCurrent.value, 3, "16"),
+    ]
+    await easee._sr_product_update_cb(updates)
+    await easee._sr_dispatcher.join()
+
+    assert power == [7.2]
+    assert doubles == [ChargerStreamData.state_totalPower.value, ChargerStreamData.state_outputCurrent.value]
+    assert everything == [u["id"] for u in updates]
+
+    # Removing one subscription leaves the others and the product subscribed
+    await easee.sr_unsubscribe(power_subscription)
+    await easee.sr_unsubscribe(all_subscription)
+    assert "EH12345" in easee.sr_subscriptions
+    await easee._sr_product_update_cb(updates)
+    await easee._sr_dispatcher.join()
+    assert power == [7.2]
+    assert len(doubles) == 4
+    # Updates nobody wants are not queued
+    assert easee.get_stream_queue_stats()["EH12345"]["delivered"] == 5
+
+    await easee.sr_unsubscribe(charger)
+    assert "EH12345" not in easee.sr_subscriptions
+    assert charger.get_stream_state() == {}
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, method, arguments):
+        self.sent.append((method, *arguments))
+
+
+@pytest.mark.asyncio
+async def test_incremental_subscribe_and_unsubscribe(easee, monkeypatch):
+    disconnects = []
+
+    async def disconnect():
+        disconnects.append(True)
+
+    monkeypatch.setattr(easee, "_sr_disconnect", disconnect)
+    shard = easee._sr_shards[0]
+    shard.connection = RecordingConnection()
+    shard.connected = True
+    chargers = [
+        Charger({"id": f"EH{n}", "name": f"Easee Home {n}", "productCode": 1, "levelOfAccess": 1}, easee)
+        for n in range(3)
+    ]
+
+    async def callback(product_id, data_type, data_id, value):
+        pass
+
+    await easee.sr_subscribe(chargers[0], callback)
+    subscriptions = await easee.sr_subscribe_many(chargers, callback)
+    assert len(subscriptions) == 3
+    # Only products that were not subscribed yet are sent
+    assert shard.connection.sent == [
+        ("SubscribeWithCurrentState", "EH0", True),
+        ("SubscribeWithCurrentState", "EH1", True),
+        ("SubscribeWithCurrentState", "EH2", True),
+    ]
+
+    shard.connection.sent.clear()
+    await easee.sr_unsubscribe(subscriptions[1])
+    await easee.sr_unsubscribe(subscriptions[0])
+    await easee.sr_unsubscribe(chargers[0])
+    assert shard.connection.sent == [("Unsubscribe", "EH1"), ("Unsubscribe", "EH0")]
+    assert list(easee.sr_subscriptions) == ["EH2"]
+    # The connection stays up
+    assert disconnects == []
+
+
+@pytest.mark.asyncio
+async def test_single_connection_attributes(easee):
+    # Code written before sharding sets and reads the connection on the client itself
+    easee.sr_connection = RecordingConnection()
+    easee.sr_connected = True
+    assert easee._sr_shards[0].connection is easee.sr_connection
+    assert easee.sr_connected and not easee.sr_connect_in_progress
+
+    charger = Charger({"id": "EH1", "name": "Easee Home 1", "productCode": 1, "levelOfAccess": 1}, easee)
+
+    async def callback(product_id, data_type, data_id, value):
+        pass
+
+    await easee.sr_subscribe(charger, callback)
+    assert easee.sr_connection.sent == [("SubscribeWithCurrentState", "EH1", True)]
+
+    easee.sr_connected = False
+    assert not easee.sr_is_connected()
+
+
+def test_hash_ring_moves_few_products():
+    product_ids = [f"EH{n:06d}" for n in range(2000)]
+    four = HashRing(4)
+    five = HashRing(5)
+
+    counts = [0] * 4
+    for product_id in product_ids:
+        counts[four.get(product_id)] += 1
+    assert min(counts) > 300
+
+    moved = sum(1 for product_id in product_ids if four.get(product_id) != five.get(product_id))
+    # Roughly the fifth that belongs on the new shard moves, a plain modulo would move most
+    assert moved < len(product_ids) * 0.3
+
+
+@pytest.mark.asyncio
+async def test_sharded_subscriptions(monkeypatch):
+    session = aiohttp.ClientSession()
+    easee = Easee("+46070123456", "password", session, sr_shards=3)
+    connecting = []
+
+    async def connect(shard, start_delay=0):
+        connecting.append(shard.index)
+
+    monkeypatch.setattr(easee, "_sr_connect", connect)
+    chargers = [
+        Charger({"id": f"EH{n}", "name": f"Easee Home {n}", "productCode": 1, "levelOfAccess": 1}, easee)
+        for n in range(30)
+    ]
+
+    async def callback(product_id, data_type, data_id, value):
+        pass
+
+    await easee.sr_subscribe_many(chargers, callback)
+    # One connect per shard, not per product
+    assert sorted(connecting) == [0, 1, 2]
+
+    shards = easee._sr_shards
+    for shard in shards:
+        shard.connection = RecordingConnection()
+    shards[0].connected = shards[1].connected = True
+    assert not easee.sr_is_connected()
+    status = easee.get_stream_status()
+    assert status["products"] == 30
+    assert sum(shard["products"] for shard in status["shards"]) == 30
+    assert [shard["connected"] for shard in status["shards"]] == [True, True, False]
+
+    # Opening a shard only subscribes its own products
+    await easee._sr_open_cb(shards[2])
+    assert easee.sr_is_connected()
+    sent = [product_id for _, product_id, _ in shards[2].connection.sent]
+    assert sent and all(easee._sr_shard(product_id) is shards[2] for product_id in sent)
+    assert len(sent) == status["shards"][2]["products"]
+
+    for shard in shards:
+        shard.connected = False
+    await easee.close()
+    await session.close()
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+import pytest
+from pyeasee import Throttler
+
+
+@pytest.mark.asyncio
+async def test_never_exceeds_rate_limit():
+    throttler = Throttler(rate_limit=3, period=0.2, name="test")
+    calls = []
+
+    async def call(n):
+        async with throttler:
+            calls.append((time.monotonic(), n))
+
+    await asyncio.gather(*[call(n) for n in range(9)])
+
+    # Served in FIFO order
+    assert [n for _, n in calls] == list(range(9))
+    # Never more than rate_limit calls in any window of period
+    times = [t for t, _ in calls]
+    for i in range(len(times) - 3):
+        assert times[i + 3] - times[i] >= 0.2 - 0.01
+
+
+@pytest.mark.asyncio
+async def test_child_takes_from_parent():
+    parent = Throttler(rate_limit=2, period=0.2, name="parent")
+    child = Throttler(rate_limit=10, period=0.2, name="child", parent=parent)
+
+    start = time.monotonic()
+    async with child:
+        pass
+    async with parent:
+        pass
+    async with child:
+        pass
+
+    assert time.monotonic() - start >= 0.2 - 0.01
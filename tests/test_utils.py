@@ -0,0 +1,47 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from pyeasee.utils import bounded_as_completed, split_date_range
+
+
+@pytest.mark.asyncio
+async def test_bounded_as_completed_limits_concurrency():
+    running = 0
+    max_running = 0
+
+    async def work(n):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01 * (n % 3))
+        running -= 1
+        return n * 2
+
+    results = {}
+    async for index, result in bounded_as_completed(work, range(10), 3):
+        results[index] = result
+
+    assert max_running == 3
+    assert results == {n: n * 2 for n in range(10)}
+
+
+def test_split_date_range_on_month_boundaries():
+    windows = split_date_range(datetime(2024, 11, 15), datetime(2025, 2, 10))
+    assert windows == [
+        (datetime(2024, 11, 15), datetime(2024, 12, 1)),
+        (datetime(2024, 12, 1), datetime(2025, 1, 1)),
+        (datetime(2025, 1, 1), datetime(2025, 2, 1)),
+        (datetime(2025, 2, 1), datetime(2025, 2, 10)),
+    ]
+
+
+def test_split_date_range_fixed_window():
+    windows = split_date_range(datetime(2025, 1, 28), datetime(2025, 2, 12), timedelta(days=7))
+    assert windows == [
+        (datetime(2025, 1, 28), datetime(2025, 2, 4)),
+        (datetime(2025, 2, 4), datetime(2025, 2, 11)),
+        (datetime(2025, 2, 11), datetime(2025, 2, 12)),
+    ]
+    with pytest.raises(ValueError):
+        split_date_range(datetime(2025, 1, 28), datetime(2025, 2, 12), timedelta(0))